@@ -1,31 +1,229 @@
-import requests
-import time
 import json
+import codecs
+import itertools
+import logging
+import math
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import card_store as store
+from search_cache import SearchCache
+from name_index import NameIndex
+from http_client import HttpClient
+from card_format import project_card, read_card_file, write_atomic, write_card_file
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Files behind each index. Nothing is read at import time,
+# each index is loaded the first time it's used and then kept
+INDEX_FILES = {"card_index": "scryfall_all.json",      # Bulk data
+               "cheap_index": "cheap_list.json",       # Cheap ramp/draw
+               "tapped_index": "mdfc_tapped.json",     # Tapped mdfc lands
+               "UNtapped_index": "mdfc_untapped.json", # Untapped mdfc lands
+               "dfc_index": "dfc.json"}                # Dfc lands
+
+_indexes = {}
+_card_store = None
+_store_checked = False
+_load_lock = threading.Lock()
+
+# What was last downloaded, so data that hasn't changed upstream isn't downloaded again
+META_FILE = "data_meta.json"
+_meta_lock = threading.Lock()
+
+# Scryfall's API, and the most names its collection endpoint takes at once
+SCRYFALL_API = "https://api.scryfall.com"
+COLLECTION_BATCH = 75
+# How long a search query for many names at once is allowed to get
+SEARCH_QUERY_LENGTH = 1000
+
+# Archidekt's names for the colors
+ARCHIDEKT_COLORS = {"White": "W", "Blue": "U", "Black": "B", "Red": "R", "Green": "G"}
+
+# Every Scryfall request goes through one pooled client,
+# kept to Scryfall's published limit of 10 requests a second
+scryfall = HttpClient(headers={"User-Agent": "MyMTGProject/1.0",
+                               "Accept": "application/json"},
+                      rate=10, burst=2)
+
+# Every Card built so far, by name, so each card only exists once per process
+_interned = {}
+# Cards that came from a Scryfall search, least recently used first
+_searched = OrderedDict()
+SEARCHED_CACHE_SIZE = 1024
+# Lookups on other threads can evict from it between a get and a move_to_end
+_searched_lock = threading.Lock()
+# Scryfall results from earlier runs, see search_cache.py
+_search_cache = None
+# Forgiving lookups of the names in our data, see name_index.py
+_name_index = None
+# The best nonbasic lands for each color identity, see land_index.py
+_land_index = None
+
+
+"""Return one of the card indexes, loading it on first use"""
+def get_index(name):
+
+    index = _indexes.get(name)
+    if index is not None:
+        return index
+
+    with _load_lock:
+        if name not in _indexes:
+            data = read_card_file(INDEX_FILES[name])
+            _indexes[name] = {card['name']: card for card in data}
+        return _indexes[name]
+
+
+"""Return the compiled card store, opening it on first use (None if it hasn't been built)"""
+def get_card_store():
+    global _card_store, _store_checked
+
+    if _store_checked:
+        return _card_store
+
+    with _load_lock:
+        if not _store_checked:
+            _card_store = store.open_card_store()
+            _store_checked = True
+        return _card_store
+
+
+"""Return the persistent cache of Scryfall search results, opening it on first use"""
+def get_search_cache():
+    global _search_cache
+
+    with _load_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache()
+        return _search_cache
+
+
+"""Return the index of alternate spellings of the names in our data, building it on first use"""
+def get_name_index():
+    global _name_index
+
+    name_index = _name_index
+    if name_index is not None:
+        return name_index
+
+    card_store = get_card_store()
+    names = card_store.names() if card_store is not None else list(get_index("card_index"))
+
+    with _load_lock:
+        if _name_index is None:
+            _name_index = NameIndex(names)
+        return _name_index
+
+
+"""Return the index of nonbasic lands by color identity and price, loading (or building) it on first use"""
+def get_land_index():
+    global _land_index
+
+    # Only needed by the land recommendations
+    import land_index
+
+    index = _land_index
+    if index is not None:
+        return index
+
+    with _load_lock:
+        if _land_index is None:
+            # Data from before the index existed builds it in memory from the bulk file
+            index = land_index.load_land_index()
+            if index is None:
+                index = land_index.build_land_index(read_card_file(INDEX_FILES["card_index"]))
+            _land_index = index
+        return _land_index
+
+
+"""Bitmask for an identity string such as "WUB" (there are only 32 of them)"""
+@lru_cache(maxsize=None)
+def identity_mask(given):
+    return store.identity_to_bits(given)
+
+
+"""Keep 'Card.card_index' and friends working as module attributes"""
+def __getattr__(name):
+    if name in INDEX_FILES:
+        return get_index(name)
+    if name == "card_store":
+        return get_card_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+"""Read what was recorded about the last download (bulk file version, search ETags)"""
+def load_meta():
+    try:
+        with open(META_FILE, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+"""Record something about a download, optionally inside a section of the file"""
+def update_meta(key, value, section=None):
+    with _meta_lock:
+        meta = load_meta()
+        target = meta.setdefault(section, {}) if section else meta
+        target[key] = value
+        write_atomic(META_FILE, json.dumps(meta, indent=2))
+
+
+"""Incrementally parse a JSON array from an iterable of byte chunks,
+   yielding each element as soon as it has been fully received"""
+def iter_json_array(chunks):
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+
+    # None marks the end of the stream, so whatever is left gets one last try
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+
+        # Drop what has already been parsed and append the new text
+        buffer = buffer[pos:] + utf8.decode(b"" if final else chunk, final)
+        pos = 0
+
+        while True:
+            # Skip whitespace and the commas between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
 
-# Index bulk data
-with open("scryfall_all.json", 'r') as bulkfile:
-    bulkdata = json.load(bulkfile)
-card_index = {card['name']: card for card in bulkdata}
+            # The stream has to open with the array itself
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
 
-# Index data of the cheap ramp/draw
-with open("cheap_list.json", 'r') as cheapfile:
-    cheap_list = json.load(cheapfile)
-cheap_index = {card['name']: card for card in cheap_list}
+            # End of the array
+            if buffer[pos] == "]":
+                return
 
-# Index tapped mdfc data
-with open("mdfc_tapped.json", 'r') as tappedfile:
-    tapped_list = json.load(tappedfile)
-tapped_index = {card['name']: card for card in tapped_list}
+            # Try to decode one element, waiting for more data if it is incomplete
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
 
-# Index untapped mdfc data
-with open("mdfc_untapped.json", 'r') as UNtappedfile:
-    UNtapped_list = json.load(UNtappedfile)
-UNtapped_index = {card['name']: card for card in UNtapped_list}
+            # A number or literal running up to the end of the buffer may carry on in the next chunk
+            if end == len(buffer) and not final and not isinstance(item, (dict, list, str)):
+                break
+            pos = end
+            yield item
 
-# Index dfc data
-with open("dfc.json", 'r') as dfcfile:
-    dfc_list = json.load(dfcfile)
-dfc_index = {card['name']: card for card in dfc_list}
+    raise ValueError("JSON array ended unexpectedly")
 
 
 
@@ -35,69 +233,288 @@ dfc_index = {card['name']: card for card in dfc_list}
 
 class Card:
 
+    # Cards are created for every slot of every deck, so keep them small
+    __slots__ = ("name", "cost", "manavalue", "identity", "id_mask",
+                 "pips", "price", "price_value", "types", "is_land", "kind")
+
     """Create a Card object"""
-    def __init__(self, name, cost, manavalue, identity, price, types):
+    def __init__(self, name, cost, manavalue, identity, price, types, kind=None):
         self.name = name
         self.cost = cost
         self.manavalue = manavalue
-        self.identity = identity
-        self.pips = {"W": 0,
-                     "U": 0,
-                     "B": 0,
-                     "R": 0,
-                     "G": 0}
-        self.det_pips()
+        self.identity = tuple(identity)
+        self.id_mask = store.identity_to_bits(identity)
+        self.pips = Card.det_pips(cost)
         self.price = price
+        self.price_value = Card.det_price(price)
         self.types = types
+        self.is_land = "Land" in types
 
-    """Count the number of each colored pip in a card"""
-    def det_pips(self):
+        # Decide whether it's cheap ramp/draw or an mdfc land once, instead of on every check
+        self.kind = Card.det_kind(name) if kind is None else kind
 
-        for symbol in self.cost:
-            if symbol in self.pips:
-                self.pips[symbol] += 1
+    """Count the number of each colored pip in a mana cost, in WUBRG order"""
+    @staticmethod
+    def det_pips(cost):
+        return tuple(cost.count(color) for color in store.COLORS)
+
+    """Parse a price, giving NaN when there isn't one (e.g. "Price not available")"""
+    @staticmethod
+    def det_price(price):
+        try:
+            return float(price)
+        except (TypeError, ValueError):
+            return math.nan
+
+    """Look up the cheap/mdfc flags for a card name"""
+    @staticmethod
+    def det_kind(name):
+
+        card_store = get_card_store()
+        if card_store is not None:
+            return card_store.kind(name)
+
+        kind = 0
+        if name in get_index("cheap_index"):
+            kind |= store.CHEAP
+        if name in get_index("tapped_index"):
+            kind |= store.MDFC_TAPPED
+        if name in get_index("UNtapped_index"):
+            kind |= store.MDFC_UNTAPPED
+        if name in get_index("dfc_index"):
+            kind |= store.DFC
+        return kind
 
     """Check if a card falls within a certain color identity"""
     def check_id(self, given):
-        for symbol in self.identity:
-            if symbol not in given:
-                return False
-        return True
+        return (self.id_mask & ~identity_mask(given)) == 0
 
     """Check to see if the card is cheap ramp/draw"""
     def is_cheap(self):
-        if cheap_index.get(self.name) is None:
-            return False
-        return True
+        return bool(self.kind & store.CHEAP)
 
     """Check to see if the card is an mdfc land"""
     def is_mdfc(self):
-        if tapped_index.get(self.name) is not None:
+        if self.kind & store.MDFC_TAPPED:
             return True, "tapped"
-        if UNtapped_index.get(self.name) is not None:
+        if self.kind & store.MDFC_UNTAPPED:
             return True, "untapped"
-        if dfc_index.get(self.name) is not None:
+        if self.kind & store.DFC:
             return True, "dfc"
         return False, None
 
-    """Given a card name, create a Card object
+    """Cards are shared between every deck that uses them, so they can't be changed once built"""
+    def __setattr__(self, attr, value):
+        if hasattr(self, attr):
+            raise AttributeError(f"Card '{self.name}' is shared and can't be modified")
+        object.__setattr__(self, attr, value)
+
+    """Given a card name, return its Card object
     First search data downloaded to the pc,
-    Then search Scryfall if not found"""
+    Then search Scryfall if not found
+    There is only ever one Card per name, shared by every deck"""
     @staticmethod
     def get_card_by_name(name):
 
-        card = card_index.get(name)
+        card = Card.get_local_card(name)
+        if card is not None:
+            return card
 
         # If the card isn't in our data, grab it online
-        if card is None:
-            print(f"{name} not found in our dataset, searching Scryfall...")
-            card = Card.search_card(name)
+        # (unless an earlier search already did)
+        cache = get_search_cache()
+        cached, card = cache.lookup(name)
+        if not cached:
+            logger.info(f"{name} not found in our dataset, searching Scryfall...")
+            try:
+                card = Card.search_card(name)
+            except ValueError:
+                card = None
+            cache.store(name, card)
 
         # If we still don't have the card's data, give up
         if card is None:
-            print(f"{name} not found on Scryfall.")
+            logger.warning(f"{name} not found on Scryfall.")
             return
 
+        return Card.remember_searched(name, card)
+
+    """Given a card name, return its Card object using only data already on the pc (None if it isn't there)"""
+    @staticmethod
+    def get_local_card(name):
+
+        # Reuse a card we've already built
+        card = _interned.get(name)
+        if card is not None:
+            return card
+        card = Card.recall_searched(name)
+        if card is not None:
+            return card
+
+        data = Card.get_local_data(name)
+        if data is None:
+            return None
+
+        # A name matched through the name index is the same card as its real name
+        # (only real names are interned, so refreshed data still replaces them)
+        card = _interned.get(data['name'])
+        if card is not None:
+            return card
+
+        # Cards from our own data live as long as the data does
+        card = Card.from_scryfall(data)
+        _interned[card.name] = card
+        return card
+
+    """Given a card name, return its Scryfall data from the data on the pc (None if it isn't there)
+    Names that aren't spelled exactly like ours (case, accents, one face of a dfc, a set code, a typo)
+    are matched through the name index"""
+    @staticmethod
+    def get_local_data(name):
+
+        card_store = get_card_store()
+        lookup = card_store.get if card_store is not None else get_index("card_index").get
+
+        card = lookup(name)
+        if card is None:
+            match = get_name_index().resolve(name)
+            if match is not None:
+                card = lookup(match)
+        return card
+
+    """Keep a card found online under both the asked-for and the real name,
+       dropping the least recently used ones once there are too many"""
+    @staticmethod
+    def remember_searched(name, card):
+
+        if not isinstance(card, Card):
+            card = Card.from_scryfall(card)
+        with _searched_lock:
+            _searched[name] = card
+            _searched[card.name] = card
+            while len(_searched) > SEARCHED_CACHE_SIZE:
+                _searched.popitem(last=False)
+
+        return card
+
+    """Return a card found online earlier (None if it isn't remembered), marking it as recently used"""
+    @staticmethod
+    def recall_searched(name):
+
+        with _searched_lock:
+            card = _searched.get(name)
+            if card is not None:
+                _searched.move_to_end(name)
+            return card
+
+    """Given many card names, return a dictionary of name -> Card (None for cards that can't be found)
+       Every name is checked against the local data first,
+       then all of the misses are fetched from Scryfall together"""
+    @staticmethod
+    def get_cards_by_names(names):
+
+        cards = {}
+        missing = []
+
+        # Each name is only resolved once
+        for name in dict.fromkeys(names):
+            card = Card.get_local_card(name)
+            cards[name] = card
+            if card is None:
+                missing.append(name)
+
+        # Everything was local, so the search cache isn't even opened
+        if not missing:
+            return cards
+
+        # Use what earlier searches found before going online
+        cache = get_search_cache()
+        results = {}
+        to_search = []
+        for name in missing:
+            cached, card = cache.lookup(name)
+            if cached:
+                results[name] = card
+            else:
+                to_search.append(name)
+
+        if to_search:
+            logger.info(f"{len(to_search)} cards not found in our dataset, searching Scryfall...")
+            for name, card in Card.search_collection(to_search).items():
+                cache.store(name, card)
+                results[name] = card
+
+        for name, card in results.items():
+            if card is None:
+                logger.warning(f"{name} not found on Scryfall.")
+            else:
+                cards[name] = Card.remember_searched(name, card)
+
+        return cards
+
+    """Fetch many cards by name from Scryfall's collection endpoint,
+       75 names per request, returning a dictionary of name -> card data (None if not found)
+       The collection endpoint answers with each card's default printing, so the cards it finds are
+       searched again for their cheapest printing, the same one search_card gives"""
+    @staticmethod
+    def search_collection(names):
+
+        found = {name: None for name in names}
+
+        # Scryfall may answer with a different name than we asked for
+        # (e.g. the full name of a double faced card), so match on each face too
+        wanted = {name.lower(): name for name in names}
+
+        for start in range(0, len(names), COLLECTION_BATCH):
+            batch = names[start:start + COLLECTION_BATCH]
+            payload = {"identifiers": [{"name": name} for name in batch]}
+
+            # The client waits out rate limits and paces the requests itself
+            response = scryfall.post(f"{SCRYFALL_API}/cards/collection", json=payload)
+            data = response.json()
+            if data.get("object") != "list":
+                logger.warning(f"Scryfall returned an error: {data.get('details', 'Unknown error')}")
+                continue
+
+            for card in data["data"]:
+                for key in [card["name"]] + card["name"].split(" // "):
+                    name = wanted.get(key.lower())
+                    if name is not None and found[name] is None:
+                        found[name] = card
+
+        cheapest = Card.search_cheapest([card["name"] for card in found.values() if card is not None])
+        for name, card in found.items():
+            if card is not None:
+                found[name] = cheapest.get(card["name"], card)
+
+        return found
+
+    """Search for the cheapest printing of many cards, as many names per search as the query length allows
+       Returns a dictionary of name -> card data for the names Scryfall found"""
+    @staticmethod
+    def search_cheapest(names):
+
+        groups = [[]]
+        length = 0
+        for name in dict.fromkeys(names):
+            term = f'!"{name}"'
+            if groups[-1] and length + len(term) + 4 > SEARCH_QUERY_LENGTH:
+                groups.append([])
+                length = 0
+            groups[-1].append(term)
+            length += len(term) + 4
+
+        found = {}
+        for terms in groups:
+            if terms:
+                for card in Card.search_scryfall(f"({' or '.join(terms)}) cheapest:usd"):
+                    found[card["name"]] = card
+        return found
+
+    """Create a Card object from Scryfall's card data"""
+    @staticmethod
+    def from_scryfall(card):
+
         # Extract relevant data
         name = card['name']
         cost = card.get('mana_cost', 'N/A')
@@ -109,6 +526,50 @@ class Card:
         # Create and return the Card object
         return Card(name, cost, mana_value, identity, price, types)
 
+    """Create a Card object from a card in an Archidekt deck
+       Archidekt sends everything but the Scryfall price, so only that comes from our own data
+       (cards we don't have use Archidekt's TCGplayer price instead of a Scryfall search)"""
+    @staticmethod
+    def from_archidekt(card):
+
+        oracle = card['oracleCard']
+        name = oracle['name']
+
+        # Reuse a card we've already built
+        built = _interned.get(name)
+        if built is not None:
+            return built
+        built = Card.recall_searched(name)
+        if built is not None:
+            return built
+
+        local = Card.get_local_data(name)
+        if local is not None:
+            # Our data may know the card by another name (Archidekt can send one face of a dfc),
+            # and that's the name the card is shared and classified under
+            name = local['name']
+            built = _interned.get(name)
+            if built is not None:
+                return built
+            price = local['prices'].get('usd', 'Price not available')
+        else:
+            tcg = card.get('prices', {}).get('tcg')
+            price = str(tcg) if tcg else 'Price not available'
+
+        # Archidekt splits the type line up and may spell the colors out
+        types = " ".join(oracle.get('superTypes', []) + oracle.get('types', []))
+        if oracle.get('subTypes'):
+            types += " — " + " ".join(oracle['subTypes'])
+        identity = [ARCHIDEKT_COLORS.get(color, color) for color in oracle.get('colorIdentity', [])]
+
+        built = Card(name, oracle.get('manaCost', 'N/A'), oracle.get('cmc', 0), identity, price, types or 'Unknown type')
+
+        # Shared the same way as cards built from Scryfall's data
+        if local is not None:
+            _interned[name] = built
+            return built
+        return Card.remember_searched(name, built)
+
     "Search for a card on Scryfall"
     @staticmethod
     def search_card(name):
@@ -123,69 +584,243 @@ class Card:
 
     "Search scryfall with a query"
     @staticmethod
-    def search_scryfall(query):
-        # Define headers as required by Scryfall
-        headers = {
-            "User-Agent": "MyMTGProject/1.0",
-            "Accept": "application/json"
-        }
+    def search_scryfall(query, first_response=None):
 
         # Base API search
-        url = f"https://api.scryfall.com/cards/search?q={query}"
+        url = f"{SCRYFALL_API}/cards/search"
+        params = {"q": query}
 
         all_cards = []
         while url:
-            response = requests.get(url, headers=headers)
-
-            # Check for rate limit error (429) and retry after some delay
-            if response.status_code == 429:
-                print("Rate limited! Waiting 1 second before retrying...")
-                time.sleep(1)  # Wait before retrying
-                continue  # Retry the same request
-
+            # The client waits out rate limits (honoring Retry-After) and paces the requests itself
+            if first_response is not None:
+                response, first_response = first_response, None
+            else:
+                response = scryfall.get(url, params=params)
             data = response.json()
 
             # Confirm data type
             if data.get("object") != "list":
-                print(f"Scryfall returned an error: {data.get('details', 'Unknown error')}")
+                logger.warning(f"Scryfall returned an error: {data.get('details', 'Unknown error')}")
                 break
 
             # Add cards from this page
             all_cards.extend(data["data"])
 
-            # Check if more pages exist
+            # Check if more pages exist (the next page's URL already has the query in it)
             url = data.get("next_page", None)
-
-            # Respect Scryfall’s rate limit (100ms delay)
-            time.sleep(0.1)
+            params = None
 
         return all_cards
 
+    """Same as search_scryfall, but returns (None, etag) without downloading anything
+       when the results haven't changed since the given ETag, otherwise (cards, new etag)"""
+    @staticmethod
+    def search_scryfall_if_changed(query, etag=None):
+
+        headers = {"If-None-Match": etag} if etag else {}
+        response = scryfall.get(f"{SCRYFALL_API}/cards/search", params={"q": query}, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+
+        return Card.search_scryfall(query, first_response=response), response.headers.get("ETag")
+
+    """Download a search into a file unless it's unchanged since the last download
+       Returns the cards (None if unchanged) and the names that were added or removed"""
+    @staticmethod
+    def download_search(query, file_path):
+
+        searches = load_meta().get("searches", {})
+        etag = searches.get(file_path) if os.path.exists(file_path) else None
+
+        cards, etag = Card.search_scryfall_if_changed(query, etag)
+        if cards is None:
+            return None, set()
+
+        # Which cards joined or left the list
+        try:
+            old_names = {card['name'] for card in read_card_file(file_path)}
+        except FileNotFoundError:
+            old_names = set()
+        changed = old_names ^ {card['name'] for card in cards}
+
+        # Marked before the file changes, so a failed refresh still rebuilds the store next time
+        update_meta("rebuild_pending", True)
+        write_card_file(file_path, cards)
+
+        update_meta(file_path, etag, section="searches")
+
+        return cards, changed
+
     """Download all relevant data"""
     @staticmethod
-    def get_new_data():
+    def get_new_data(progress=None):
         print("Getting new data...")
         print("This will take a while...")
-        Card.download_bulk_data()
-        Card.download_cheap_data()
-        Card.download_mdfc_tapped_data()
-        Card.download_mdfc_untapped_data()
-        Card.download_dfc_data()
 
-    """Download bulk data for the cheapest version of every commander legal card"""
+        # progress(stage, message) is told when each stage starts and finishes
+        if progress is None:
+            progress = lambda stage, message: print(f"[{stage}] {message}")
+
+        stages = {"bulk": Card.download_bulk_data,
+                  "cheap": Card.download_cheap_data,
+                  "mdfc tapped": Card.download_mdfc_tapped_data,
+                  "mdfc untapped": Card.download_mdfc_untapped_data,
+                  "dfc": Card.download_dfc_data}
+        timings = {}
+        results = {}
+
+        # A refresh that saved new files but failed before rebuilding from them leaves this set,
+        # and its changes are lost, so everything is rebuilt and reloaded
+        pending = load_meta().get("rebuild_pending", False)
+
+        def run(stage, download):
+            progress(stage, "started")
+            start = time.perf_counter()
+            results[stage] = download()
+            timings[stage] = round(time.perf_counter() - start, 2)
+            progress(stage, f"finished in {timings[stage]}s")
+
+        # Run every download at once, they all share the Scryfall client's rate limit
+        with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+            futures = [pool.submit(run, stage, download) for stage, download in stages.items()]
+            for future in as_completed(futures):
+                future.result()
+
+        # The bulk download returns the cards whose cheapest printing changed,
+        # the searches return the names that joined or left their list
+        bulk_changes = results.pop("bulk")
+        kind_changes = set().union(*results.values())
+
+        # Nothing changed upstream, so there's nothing to rebuild
+        import land_index
+        if not pending and not bulk_changes and not kind_changes and os.path.exists(store.STORE_FILE) \
+                and os.path.exists(land_index.INDEX_FILE):
+            update_meta("rebuild_pending", False)
+            progress("card store", "already up to date")
+            return timings
+
+        start = time.perf_counter()
+        Card.build_card_store()
+        if pending:
+            Card.reload_data()
+        else:
+            Card.apply_changes(bulk_changes, kind_changes)
+        timings["card store"] = round(time.perf_counter() - start, 2)
+        progress("card store", f"finished in {timings['card store']}s")
+
+        # The land index only depends on the bulk data
+        if pending or bulk_changes or not os.path.exists(land_index.INDEX_FILE):
+            start = time.perf_counter()
+            Card.build_land_index()
+            timings["land index"] = round(time.perf_counter() - start, 2)
+            progress("land index", f"finished in {timings['land index']}s")
+
+        # Only cleared once everything built from the new files is saved
+        update_meta("rebuild_pending", False)
+        return timings
+
+    """Compile the downloaded files into the memory-mapped card store"""
+    @staticmethod
+    def build_card_store():
+
+        # Release our own mapping first, the file can't be replaced while it's mapped on Windows
+        Card.close_card_store()
+
+        count = store.build_from_json()
+        print(f"Compiled {count} cards into '{store.STORE_FILE}'")
+
+    """Build the nonbasic land index from the bulk data and save it next to the card files"""
     @staticmethod
-    def download_bulk_data():
-        """Downloads Scryfall's full card database and saves only the cheapest version of each card."""
+    def build_land_index():
+        global _land_index
+
+        import land_index
+
+        index = land_index.build_land_index(read_card_file(INDEX_FILES["card_index"]))
+        index.save()
+        with _load_lock:
+            _land_index = index
+        print(f"Indexed {len(index)} nonbasic lands into '{land_index.INDEX_FILE}'")
 
-        # Define headers as required by Scryfall
-        headers = {
-            "User-Agent": "MyMTGProject/1.0",
-            "Accept": "application/json"
-        }
+    """Close the card store, it's reopened on the next lookup"""
+    @staticmethod
+    def close_card_store():
+        global _card_store, _store_checked
+
+        with _load_lock:
+            if _card_store is not None:
+                _card_store.close()
+            _card_store = None
+            _store_checked = False
+
+    """Bring the loaded data up to date after a refresh
+       The bulk file and the card store are always rebuilt whole, this only spares the in-memory
+       Cards (and indexes) that didn't change
+       bulk_changes maps a name to its new card data (None if it's gone),
+       kind_changes holds names that joined or left the cheap/mdfc/dfc lists"""
+    @staticmethod
+    def apply_changes(bulk_changes, kind_changes):
+        global _name_index, _land_index
+
+        Card.close_card_store()
+
+        with _load_lock:
+            # Once there's a store every lookup goes through it, so the bulk index is just dropped,
+            # otherwise it's patched in place
+            card_index = _indexes.get("card_index")
+            if card_index is not None and os.path.exists(store.STORE_FILE):
+                del _indexes["card_index"]
+            elif card_index is not None:
+                for name, card in bulk_changes.items():
+                    if card is None:
+                        card_index.pop(name, None)
+                    else:
+                        card_index[name] = card
+
+            # The smaller lists are quick to read again
+            for name in INDEX_FILES:
+                if name != "card_index":
+                    _indexes.pop(name, None)
+
+            # Only the Cards that changed get rebuilt
+            with _searched_lock:
+                for name in list(bulk_changes) + list(kind_changes):
+                    _interned.pop(name, None)
+                    _searched.pop(name, None)
+
+            # Names came or went, so the name and land indexes need building again
+            if bulk_changes:
+                _name_index = None
+                _land_index = None
+
+    """Forget every loaded index so the next lookup reads the current files,
+       letting a running process pick up new data without restarting"""
+    @staticmethod
+    def reload_data():
+        global _card_store, _store_checked, _name_index, _land_index
+
+        with _load_lock:
+            _indexes.clear()
+            _name_index = None
+            _land_index = None
+            _interned.clear()
+            with _searched_lock:
+                _searched.clear()
+            if _card_store is not None:
+                _card_store.close()
+            _card_store = None
+            _store_checked = False
+
+    """Download bulk data for the cheapest version of every commander legal card"""
+    @staticmethod
+    def download_bulk_data(stream=True):
+        """Downloads Scryfall's full card database and saves only the cheapest version of each card.
+           With stream=True the file is parsed as it arrives, so memory only grows with the number of unique names."""
 
         # Get the URL for the bulk card data
-        bulk_url = "https://api.scryfall.com/bulk-data"
-        response = requests.get(bulk_url, headers=headers)
+        bulk_url = f"{SCRYFALL_API}/bulk-data"
+        response = scryfall.get(bulk_url)
         bulk_data = response.json()
 
         # Find the default bulk data (all cards)
@@ -197,19 +832,85 @@ class Card:
 
         if not all_cards_url:
             print("Failed to find bulk card data.")
-            return
+            return {}
+
+        # Skip the download if this is the same file we got last time
+        last = load_meta().get("bulk", {}) if os.path.exists("scryfall_all.json") else {}
+        version = {"updated_at": item.get("updated_at"), "size": item.get("size")}
+        if last and all(last.get(key) == value for key, value in version.items()):
+            print("Bulk card data hasn't changed since the last download.")
+            return {}
 
         print(f"Downloading bulk card data from {all_cards_url}...")
 
-        # Download the full card database
-        response = requests.get(all_cards_url)
-        all_cards = response.json()
+        # Download the full card database, unless the server says it's the same as before
+        headers = {"If-None-Match": last["etag"]} if last.get("etag") else {}
+        if stream:
+            with scryfall.get(all_cards_url, headers=headers, stream=True) as response:
+                if response.status_code == 304:
+                    print("Bulk card data hasn't changed since the last download.")
+                    update_meta("bulk", dict(version, etag=last["etag"]))
+                    return {}
+                response.raise_for_status()
+                cheapest_cards = Card.reduce_cheapest(iter_json_array(response.iter_content(chunk_size=1 << 20)))
+        else:
+            response = scryfall.get(all_cards_url, headers=headers)
+            if response.status_code == 304:
+                print("Bulk card data hasn't changed since the last download.")
+                update_meta("bulk", dict(version, etag=last["etag"]))
+                return {}
+            cheapest_cards = Card.reduce_cheapest(response.json())
+
+        # Work out which cards actually changed
+        changes = Card.diff_cheapest("scryfall_all.json", cheapest_cards)
+
+        if changes:
+            # Convert dictionary to a list for saving
+            cheapest_card_list = list(cheapest_cards.values())
+
+            # Save to a local JSON file (see download_search for the mark)
+            update_meta("rebuild_pending", True)
+            write_card_file("scryfall_all.json", cheapest_card_list)
+
+            print(f"Saved {len(cheapest_card_list)} cheapest card versions to 'scryfall_all.json' ({len(changes)} changed).")
+        else:
+            print("No card's cheapest version or price changed.")
+
+        update_meta("bulk", dict(version, etag=response.headers.get("ETag")))
+        return changes
+
+    """Compare newly downloaded cheapest cards against the saved file
+       Returns name -> new card data for every card that's new, has a different cheapest printing or price,
+       and name -> None for every card that's gone"""
+    @staticmethod
+    def diff_cheapest(file_path, cheapest_cards):
+
+        # Only the (id, price) of each old card is needed
+        old = {}
+        if os.path.exists(file_path):
+            for card in read_card_file(file_path):
+                old[card['name']] = (card.get('id'), card['prices'].get('usd'))
+
+        changes = {}
+        for name, card in cheapest_cards.items():
+            if old.pop(name, None) != (card.get('id'), card['prices'].get('usd')):
+                changes[name] = card
+        for name in old:
+            changes[name] = None
+
+        return changes
+
+    """Keep only the cheapest printing of each card name, in a single pass over any iterable of cards
+       Only the fields we save are kept for each one"""
+    @staticmethod
+    def reduce_cheapest(cards):
 
         # Dictionary to store only the cheapest version of each card
         cheapest_cards = {}
+        # The parsed price of each stored card, so it isn't converted again on every comparison
+        cheapest_prices = {}
 
-        for card in all_cards:
-            name = card["name"]
+        for card in cards:
             price = card["prices"].get("usd")
 
             # Ignore cards with no listed USD price
@@ -217,19 +918,15 @@ class Card:
                 continue
 
             price = float(price)
+            name = card["name"]
 
             # If the card isn't stored yet OR if this version is cheaper, update it
-            if name not in cheapest_cards or price < float(cheapest_cards[name]["prices"]["usd"]):
-                cheapest_cards[name] = card
+            best = cheapest_prices.get(name)
+            if best is None or price < best:
+                cheapest_prices[name] = price
+                cheapest_cards[name] = project_card(card)
 
-        # Convert dictionary to a list for saving
-        cheapest_card_list = list(cheapest_cards.values())
-
-        # Save to a local JSON file
-        with open("scryfall_all.json", "w", encoding="utf-8") as file:
-            json.dump(cheapest_card_list, file, indent=2)
-
-        print(f"Saved {len(cheapest_card_list)} cheapest card versions to 'scryfall_all.json'.")
+        return cheapest_cards
 
     """Download data for the cheapest version for all draw/ramp cards less than 4 mana"""
     @staticmethod
@@ -237,14 +934,15 @@ class Card:
 
         print("Downloading data on cheap draw and ramp from Scryfall...")
 
-        cheap_list = Card.search_scryfall("f:edh cheapest:usd (function:ramp or function:draw) -mana:x cmc<4 -t:sticker -t:attraction")
-
         file_path = "cheap_list.json"
 
-        with open(file_path, 'w') as json_file:
-            json.dump(cheap_list, json_file, indent=4)
+        cheap_list, changed = Card.download_search("f:edh cheapest:usd (function:ramp or function:draw) -mana:x cmc<4 -t:sticker -t:attraction", file_path)
+        if cheap_list is None:
+            print(f"'{file_path}' hasn't changed since the last download.")
+            return changed
 
         print(f"Saved {len(cheap_list)} cheap ramp/draw cards saved to '{file_path}'")
+        return changed
 
     """Download data for all mdfc lands that DON'T enter untapped"""
     @staticmethod
@@ -252,14 +950,15 @@ class Card:
 
         print("Downloading data on tapped mdfc lands from Scryfall...")
 
-        mdfc_tapped = Card.search_scryfall(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land is:mdfc -o:"As this land enters, you may pay 3 life. If you don’t, it enters tapped."')
-
         file_path = "mdfc_tapped.json"
 
-        with open(file_path, 'w') as json_file:
-            json.dump(mdfc_tapped, json_file, indent=4)
+        mdfc_tapped, changed = Card.download_search(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land is:mdfc -o:"As this land enters, you may pay 3 life. If you don’t, it enters tapped."', file_path)
+        if mdfc_tapped is None:
+            print(f"'{file_path}' hasn't changed since the last download.")
+            return changed
 
         print(f"Saved {len(mdfc_tapped)} tapped mdfc lands saved to '{file_path}'")
+        return changed
 
     """Download data for all mdfc lands that CAN enter untapped"""
     @staticmethod
@@ -267,14 +966,15 @@ class Card:
 
         print("Downloading data on untapped mdfc lands from Scryfall...")
 
-        mdfc_untapped = Card.search_scryfall(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land is:mdfc o:"As this land enters, you may pay 3 life. If you don’t, it enters tapped."')
-
         file_path = "mdfc_untapped.json"
 
-        with open(file_path, 'w') as json_file:
-            json.dump(mdfc_untapped, json_file, indent=4)
+        mdfc_untapped, changed = Card.download_search(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land is:mdfc o:"As this land enters, you may pay 3 life. If you don’t, it enters tapped."', file_path)
+        if mdfc_untapped is None:
+            print(f"'{file_path}' hasn't changed since the last download.")
+            return changed
 
         print(f"Saved {len(mdfc_untapped)} untapped mdfc lands saved to '{file_path}'")
+        return changed
 
     """Download data for all dfc lands that are NOT mdfcs"""
     @staticmethod
@@ -282,14 +982,15 @@ class Card:
 
         print("Downloading data on dfc lands from Scryfall...")
 
-        dfc = Card.search_scryfall(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land -is:mdfc')
-
         file_path = "dfc.json"
 
-        with open(file_path, 'w') as json_file:
-            json.dump(dfc, json_file, indent=4)
+        dfc, changed = Card.download_search(r'f:edh cheapest:usd -t:/^[^\/]*Land/ t:Land -is:mdfc', file_path)
+        if dfc is None:
+            print(f"'{file_path}' hasn't changed since the last download.")
+            return changed
 
         print(f"Saved {len(dfc)} dfc lands saved to '{file_path}'")
+        return changed
 
 
 
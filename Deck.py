@@ -1,22 +1,75 @@
+import logging
+import math
 from Card import Card
+import Card as card_data
+from card_store import COLORS
 import grab_from_archidekt as Arch
+import decklist
+import land_base
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class AnalysisResult:
+
+    """Everything the analysis found that's worth telling the user about"""
+    def __init__(self):
+        self.warnings = []             # General messages, e.g. about the commanders
+        self.identity_violations = []  # (card name, card identity) for cards outside the deck's identity
+        self.unresolved = []           # Names that couldn't be found anywhere
+        self.malformed = []            # (line number, line) for decklist lines that couldn't be read
+        self.land_comparison = None    # Current vs recommended land count, see Deck.compare_land_counts
+        self.simulation = None         # Goldfish game results, see Deck.simulate
+
+    """Add a warning and pass it on to the logger"""
+    def warn(self, message):
+        self.warnings.append(message)
+        logger.warning(message)
+
+    def as_dict(self):
+        return {"warnings": self.warnings,
+                "identity_violations": self.identity_violations,
+                "unresolved": self.unresolved,
+                "malformed": self.malformed,
+                "land_comparison": self.land_comparison,
+                "simulation": self.simulation}
+
 
 class Deck:
 
+    # What to do with cards that have no price:
+    #   "skip"  - leave them out of the total (they're counted in unpriced_count)
+    #   "nan"   - the total price becomes NaN
+    #   "raise" - raise a ValueError
+    missing_price = "skip"
+
     """Create a deck object"""
     def __init__(self, commander1, commander2 = None, deck_size = 100):
 
         # Create a decklist object
-        self.decklist = [None for _ in range(deck_size)]
+        # Each card name maps to [Card, quantity], in the order the cards were added
+        self.deck_size = deck_size
+        self.entries = {}
+        self.card_count = 0
+
+        # What the analysis finds (warnings, identity violations, ...)
+        self.result = AnalysisResult()
+
+        # Running totals, kept up to date as cards are added and removed
+        self.reset_totals()
 
         # Determine what the commanders are
         if commander2 is None:
             self.commander = [commander1]
-            self.add_card(1, commander1)
         else:
             self.commander = [commander1, commander2]
-            self.add_card(1, commander1)
-            self.add_card(1, commander2)
+        self.commander_cards = [self.add_card(1, commander) for commander in self.commander]
+
+        # The deck can't be analyzed without its commanders
+        for name, card in zip(self.commander, self.commander_cards):
+            if card is None:
+                raise ValueError(f"No card found for {name}")
 
         self.identity = self.det_color_identity()
         self.check_commanders()
@@ -32,8 +85,8 @@ class Deck:
         id = []
 
         # Add the color identities of all commanders
-        for i in range(len(self.commander)):
-            id += self.decklist[i].identity
+        for commander in self.commander_cards:
+            id += commander.identity
 
         # Get each unique color in that identity and then put it in WUBRG order
         unique_letters = set(filter(lambda letter: letter in "WUBRG", id))
@@ -43,83 +96,236 @@ class Deck:
     def check_commanders(self):
 
         # Is it a Legendary Creature?
-        for i in range(len(self.commander)):
-            if "Legendary" in self.decklist[i].types and "Creature" in self.decklist[i].types:
+        for commander in self.commander_cards:
+            if "Legendary" in commander.types and "Creature" in commander.types:
                 return
 
-            print(f"{self.decklist[i].name} is not a legal commander according to our records.")
-            print("This may mean it is a special kind of commander we haven't accounted for!")
-            print("We will continue assuming this is the case :)")
+            self.result.warn(f"{commander.name} is not a legal commander according to our records. "
+                             "This may mean it is a special kind of commander we haven't accounted for! "
+                             "We will continue assuming this is the case :)")
+
+    """Every card in the deck, one entry per copy, in the order they were added"""
+    @property
+    def decklist(self):
+        return [card for card, quantity in self.entries.values() for _ in range(quantity)]
 
-    """Add a card to the deck in the next blank space given a quantity and the card's name"""
+    """Add a card to the deck given a quantity and the card's name"""
     def add_card(self, quantity, name):
 
-        # Put the card in the next available None slot
-        if None in self.decklist:
-            for i in range(quantity):
-                self.decklist[self.decklist.index(None)] = Card.get_card_by_name(name)
-            return
+        # Every copy is the same shared Card, so it's only looked up once
+        card = Card.get_card_by_name(name)
+        if card is None:
+            self.result.unresolved.append(name)
+            return None
 
-        raise IndexError("There are no empty spaces left in the deck!")
+        return self.place_card(quantity, card)
 
-    """Import a decklist given a txt file
-       Format required: quantityx cardname"""
-    def import_decklist_from_file(self, filename):
+    """Add many cards given a list of (quantity, name), looking all of the names up together"""
+    def add_cards(self, entries):
 
-        # Open the file
-        with open(filename, "r", encoding='utf-8') as file:
-            for line in file:
+        cards = Card.get_cards_by_names([name for quantity, name in entries])
 
-                # Determine the quantity and card name depending on where 'quantityx' is
-                quantity = int(line.split("x ")[0])
-                name = "".join(line.split("x ", 1)[1:]).strip()
+        for quantity, name in entries:
+            if cards[name] is None:
+                self.result.unresolved.append(name)
+            else:
+                self.place_card(quantity, cards[name])
 
-                # Add each card to the deck if it's not one of your commanders
-                # (They were previously added)
-                if name not in self.commander:
-                    self.add_card(quantity, name)
+    """Add copies of an already resolved Card to the deck"""
+    def place_card(self, quantity, card):
 
-        # Determine various important deck statistics
-        self.det_stats()
-        # Make sure each card fits within the commanders' color identity
-        self.check_identity()
+        # Make sure there's room for every copy
+        if self.card_count + quantity > self.deck_size:
+            raise IndexError("There are no empty spaces left in the deck!")
+
+        entry = self.entries.get(card.name)
+        if entry is None:
+            self.entries[card.name] = [card, quantity]
+        else:
+            entry[1] += quantity
+        self.card_count += quantity
+        self.tally(card, quantity)
+
+        return card
+
+    """Remove some copies of a card from the deck"""
+    def remove_card(self, quantity, name):
+
+        entry = self.entries.get(name)
+        if entry is None or entry[1] < quantity:
+            raise ValueError(f"The deck doesn't have {quantity} copies of {name}")
+
+        entry[1] -= quantity
+        if entry[1] == 0:
+            del self.entries[name]
+        self.card_count -= quantity
+        self.tally(entry[0], -quantity)
+
+        return entry[0]
+
+    """Start every running total from zero"""
+    def reset_totals(self):
+        self.spell_count = 0
+        self.manavalue_sum = 0
+        self.lands_played = 0   # Every card with Land in its type, mdfcs included
+        self.price_sum = 0
+        self.unpriced_count = 0
+        self.pip_count = {"W": 0,
+                          "U": 0,
+                          "B": 0,
+                          "R": 0,
+                          "G": 0}
+        self.cheap_count = 0
+        self.mdfc_count = 0
+        self.mdfc_tapped = 0
+        self.mdfc_untapped = 0
+        self.dfc_count = 0
+        self.nonbasic_count = 0   # Nonbasic lands (not mdfcs), kept by the land recommendation
+        self.nonbasic_sources = {"W": 0,
+                                 "U": 0,
+                                 "B": 0,
+                                 "R": 0,
+                                 "G": 0}
+
+        # What the land recommendation was last worked out from
+        self.rec_inputs = None
+        self.compare_inputs = None
+        self.basics_inputs = None
+
+    """Add a card's copies to the running totals (a negative quantity takes them away)"""
+    def tally(self, card, quantity):
+
+        # The card price
+        if math.isnan(card.price_value):
+            self.unpriced_count += quantity
+        else:
+            self.price_sum += card.price_value * quantity
+
+        # Count the number of nonland cards
+        # Account for their mana values and pips
+        if not card.is_land:
+            self.spell_count += quantity
+            self.manavalue_sum += card.manavalue * quantity
+
+            for color, pips in zip(COLORS, card.pips):
+                self.pip_count[color] += pips * quantity
+        else:
+            self.lands_played += quantity
+
+        # Cheap ramp and card draw
+        if card.is_cheap():
+            self.cheap_count += quantity
+
+        # Mdfc lands
+        det, kind = card.is_mdfc()
+        if det:
+            if kind == "tapped":
+                self.mdfc_tapped += quantity
+            if kind == "untapped":
+                self.mdfc_untapped += quantity
+            if kind == "dfc":
+                self.dfc_count += quantity
+            self.mdfc_count += quantity
+
+        # Nonbasic lands stay in the deck, so the basics are recommended around them
+        if land_base.is_nonbasic_land(card):
+            self.nonbasic_count += quantity
+            for color in land_base.land_colors(card):
+                self.nonbasic_sources[color] += quantity
+
+    """Rebuild the running totals from the decklist"""
+    def recount(self):
+        self.reset_totals()
+        for card, quantity in self.entries.values():
+            self.tally(card, quantity)
+
+    """Import a decklist given a txt file
+       Format required: quantityx cardname (see decklist.py for what else is understood)"""
+    def import_decklist_from_file(self, filename):
+
+        # Read the file a line at a time
+        with open(filename, "r", encoding='utf-8') as file:
+            return self.import_decklist_lines(file)
 
     """Same as above, except from a list pasted into a text box"""
     def import_decklist_from_text(self, text):
+        return self.import_decklist_lines(text.splitlines())
 
-        for line in text.splitlines():
-            quantity = int(line.split("x ")[0])
-            name = "".join(line.split("x ", 1)[1:]).strip()
+    """Import a decklist from any iterable of lines"""
+    def import_decklist_lines(self, lines):
 
-            if name not in self.commander:
-                self.add_card(quantity, name)
+        # Each name comes out once, with the quantities of repeated lines added together
+        entries, malformed = decklist.read_decklist(lines)
+        self.result.malformed.extend(malformed)
 
+        # Add each card to the deck if it's not one of your commanders
+        # (They were previously added)
+        # Look every card up in one go
+        self.add_cards([(quantity, name) for quantity, name, annotations in entries
+                        if name not in self.commander])
+
+        # Determine various important deck statistics
         self.det_stats()
+        # Make sure each card fits within the commanders' color identity
         self.check_identity()
 
+        return self.result
+
 
     """Same as the above, except this searches for an Archidekt deck rather than using a txt file"""
     @staticmethod
     def import_decklist_from_archidekt(owner, deck_name):
 
-        # Find the deck
-        deck_url, deck_id = Arch.search_archidekt(owner, deck_name)
+        # Find the deck (the most recently updated match)
+        decks = Arch.search_decks(owner, deck_name)
+        if not decks:
+            raise ValueError(f"No Archidekt deck named '{deck_name}' found for {owner}")
 
         # Grab the decklist, including which cards are the commanders
-        my_decklist, commanders = Arch.get_archidekt_deck(deck_id)
+        # (a cached copy is used if the deck hasn't been updated since)
+        my_decklist, commanders = Arch.get_archidekt_deck(decks[0]["id"], decks[0]["updatedAt"])
+
+        # Return the deck object
+        return Deck.from_archidekt_list(my_decklist, commanders)
+
+    """Import many Archidekt decks by id (or search results, which lets unchanged decks come from the cache),
+       fetching them concurrently
+       Returns a dictionary of deck id to Deck object (or the exception raised for that deck)"""
+    @staticmethod
+    def import_many_from_archidekt(deck_ids, concurrency=Arch.CONCURRENCY):
+
+        decks = {}
+        for deck, fetched in zip(deck_ids, Arch.get_archidekt_decks(deck_ids, concurrency)):
+            deck_id = Arch.deck_key(deck)[0]
+            if isinstance(fetched, Exception):
+                logger.warning(f"Couldn't fetch Archidekt deck {deck_id}: {fetched}")
+                decks[deck_id] = fetched
+                continue
+
+            try:
+                decks[deck_id] = Deck.from_archidekt_list(*fetched)
+            except Exception as e:
+                logger.warning(f"Couldn't analyze Archidekt deck {deck_id}: {e}")
+                decks[deck_id] = e
+
+        return decks
+
+    """Build and analyze a deck from an Archidekt decklist of (quantity, card data) and its commanders"""
+    @staticmethod
+    def from_archidekt_list(my_decklist, commanders):
+
+        # Build every card from the data Archidekt sent, rather than looking each name up again
+        cards = [(quantity, Card.from_archidekt(card)) for quantity, card in my_decklist]
 
         # Create a deck object with the appropriate commander(s)
+        # (they were built just above, so this finds them without a search)
         my_deck = Deck(commanders[0], commanders[1])
 
-        # Determine the quantity and card name depending on where 'quantityx' is
-        for item in my_decklist:
-            quantity = int(item.split("x ")[0])
-            name = "".join(item.split("x ", 1)[1:]).strip()
-
-            # Add each card to the deck if it's not one of your commanders
-            # (They were previously added)
-            if name not in my_deck.commander:
-                my_deck.add_card(quantity, name)
+        # Add each card to the deck if it's not one of your commanders
+        # (They were previously added, and may go by another name in our data than in Archidekt's)
+        for quantity, card in cards:
+            if card not in my_deck.commander_cards:
+                my_deck.place_card(quantity, card)
 
         # Determine various important deck statistics
         my_deck.det_stats()
@@ -132,55 +338,38 @@ class Deck:
     """Determine various statistics about the deck"""
     def det_stats(self):
 
-        # Initialize several variables
-        self.avg_manavalue = 0
-        self.spell_count = 0
-        self.land_count = 0
-        self.total_price = 0
-        self.pip_count = {"W": 0,
-                          "U": 0,
-                          "B": 0,
-                          "R": 0,
-                          "G": 0}
-        self.mdfc_count = 0
-        self.mdfc_tapped = 0
-        self.mdfc_untapped = 0
-
-        # This counts the number of cheap ramp and card draw in the deck
-        self.count_cheap()
-
-        # This counts the number of mdfc lands in the deck
-        self.count_mdfc()
-
-        for card in self.decklist:
-
-            # Add the card price
-            self.total_price += float(card.price)
-
-            # Count the number of nonland cards
-            # Account for their mana values and pips
-            if "Land" not in card.types:
-                self.spell_count += 1
-                self.avg_manavalue += card.manavalue
-
-                for i in card.pips:
-                    self.pip_count[i] += card.pips[i]
-
-            else:
-                self.land_count += 1
-
-        self.land_count -= self.mdfc_count
+        # The totals are kept up to date by add_card and remove_card,
+        # so this only has to finish the numbers off
+        self.land_count = self.lands_played - self.dfc_count - self.mdfc_count
 
         # Using those numbers, determine the average mana value of the deck
-        self.avg_manavalue /= self.spell_count
-        self.avg_manavalue = round(self.avg_manavalue, 2)
-
-        self.total_price = round(self.total_price, 2)
+        self.avg_manavalue = round(self.manavalue_sum / self.spell_count, 2) if self.spell_count else 0
 
-        # Figure out what lands the deck should play
-        self.det_land_count() # How many
-        self.compare_land_counts() # Compare that to how many currently in the deck
-        self.rec_basics()     # Recommend that many basics, with ratios according to the pip count
+        # Cards without a price are handled according to missing_price
+        if self.unpriced_count and self.missing_price == "raise":
+            raise ValueError(f"{self.unpriced_count} cards have no price")
+        if self.unpriced_count and self.missing_price == "nan":
+            self.total_price = math.nan
+        else:
+            self.total_price = round(self.price_sum, 2)
+
+        # Figure out what lands the deck should play,
+        # only redoing each step when something it depends on has changed
+        rec_inputs = (self.avg_manavalue, self.cheap_count, len(self.commander))
+        if rec_inputs != self.rec_inputs:
+            self.det_land_count() # How many
+            self.rec_inputs = rec_inputs
+
+        compare_inputs = (self.land_count, self.mdfc_untapped, self.mdfc_tapped, self.rec_land_count)
+        if compare_inputs != self.compare_inputs:
+            self.compare_land_counts() # Compare that to how many currently in the deck
+            self.compare_inputs = compare_inputs
+
+        basics_inputs = (tuple(self.pip_count.values()), self.identity, self.rec_land_count,
+                         self.nonbasic_count, tuple(self.nonbasic_sources.values()))
+        if basics_inputs != self.basics_inputs:
+            self.rec_basics()     # Recommend that many basics, with ratios according to the pip count
+            self.basics_inputs = basics_inputs
 
     """Determine the number of lands recommended for the deck"""
     def det_land_count(self):
@@ -195,92 +384,104 @@ class Deck:
     def compare_land_counts(self):
         current =  self.land_count + (self.mdfc_untapped * .74) + (self.mdfc_tapped * .38)
         diff = current - self.rec_land_count
-        print()
-        print()
         self.comparison_statement = ""
         if diff < 0:
             self.comparison_statement = f"You are playing {round(diff, 1) * -1} less lands in your deck than recommended"
         else: self.comparison_statement = f"You are playing {round(diff, 1)} more lands in your deck than recommended"
 
-    """Check if each card is within the deck's color identity"""
-    def check_identity(self):
-
-        # Print each card not in the color identity
-        for card in self.decklist:
-            if not card.check_id(self.identity):
-                print(f"{card.name} is not in the deck's identity")
-                print(f"     {card.identity} not in {self.identity}")
-
-    """Counts the number of cheap ramp/draw in the deck"""
-    def count_cheap(self):
+        self.result.land_comparison = {"current": round(current, 2),
+                                       "recommended": self.rec_land_count,
+                                       "difference": round(diff, 2),
+                                       "statement": self.comparison_statement}
 
-        self.cheap_count = 0
+    """Play goldfish games with the deck to check the land count against how it actually draws
+       (see simulation.py for what's returned)"""
+    def simulate(self, games=100000, turns=7, on_the_play=True, seed=None):
 
-        for card in self.decklist:
-            if card.is_cheap():
-                self.cheap_count += 1
+        # Only needed (along with NumPy) when simulating
+        import simulation
 
-    """Counts the number of mdfc lands in the deck"""
-    def count_mdfc(self):
+        self.result.simulation = simulation.simulate(self, games, turns, on_the_play, seed, self.produced_colors())
+        return self.result.simulation
 
-        for card in self.decklist:
+    """Check if each card is within the deck's color identity"""
+    def check_identity(self):
 
-            det, kind = card.is_mdfc()
-            if det:
-                if kind == "tapped":
-                    self.mdfc_tapped += 1
-                if kind == "untapped":
-                    self.mdfc_untapped += 1
-                if kind == "dfc":
-                    self.land_count -= 1
-                self.mdfc_count += 1
+        # Record each card not in the color identity
+        self.result.identity_violations = []
+        for card, quantity in self.entries.values():
+            if not card.check_id(self.identity):
+                self.result.identity_violations.append((card.name, ''.join(card.identity)))
+                logger.info(f"{card.name} is not in the deck's identity: {list(card.identity)} not in {self.identity}")
 
-    """Create a list of basic lands, evenly distributed for each color in the deck"""
+    """Create a list of basic lands, distributed between the colors in the deck by their pips
+       The nonbasic lands already in the deck fill some of the recommended land count"""
     def rec_basics(self):
-
-        # Determine the total number of colored pips in the deck
-        pip_sum = 0
-        for i in self.pip_count:
-            pip_sum += self.pip_count[i]
-
-        # Use the ratio of a type of pip to the total pips to determine the number of each basic
-        plains_count = round(self.pip_count["W"] / pip_sum * self.rec_land_count)
-        islands_count = round(self.pip_count["U"] / pip_sum * self.rec_land_count)
-        swamps_count = round(self.pip_count["B"] / pip_sum * self.rec_land_count)
-        mountains_count = round(self.pip_count["R"] / pip_sum * self.rec_land_count)
-        forest_count = round(self.pip_count["G"] / pip_sum * self.rec_land_count)
-        wastes_count = self.rec_land_count if plains_count == islands_count == swamps_count == mountains_count == forest_count == 0 else 0
-
-        # Put it into a dictionary
-        basic_counts = {"Plains": plains_count,
-                        "Island": islands_count,
-                        "Swamp": swamps_count,
-                        "Mountain": mountains_count,
-                        "Forest": forest_count,
-                        "Wastes": wastes_count
-                        }
-
-        # Make sure it recommends the correct number of lands
-        difference = round(self.rec_land_count) - sum(basic_counts.values())
-        max_land = max(basic_counts, key=basic_counts.get)
-
-        # If it doesn't, make the change on the most common basic type
-        if difference > 0:
-            basic_counts[max_land] += difference
-        elif difference < 0:
-            basic_counts[max_land] -= difference
-
-        # Remove any basics where there are 0 recommended
-        for key, value in list(basic_counts.items()):
-            if value == 0:
-                basic_counts.pop(key)
-
-        # Store it
-        self.basics = basic_counts
-
-    """Replace some basics with the best nonbasic lands for the colors"""
-    def rec_non_basics(self):
-        pass
+        self.basics = land_base.allocate_basics(self.identity_pips(), self.rec_land_count,
+                                                self.nonbasic_count, self.nonbasic_sources)
+
+    """The pip count, leaving out colors outside the deck's identity (no basics can be played for them)"""
+    def identity_pips(self):
+        return {color: pips for color, pips in self.pip_count.items() if color in self.identity}
+
+    """Move basics between colors while it makes spells castable on curve more often in goldfish games
+       (slower than rec_basics, see land_base.optimize_basics)"""
+    def optimize_basics(self, games=land_base.SEARCH_GAMES, turns=7, seed=0):
+        spells, fixed = self.split_library()
+        self.basics, score = land_base.optimize_basics(spells, self.basics, fixed, games, turns, seed,
+                                                       produced=self.produced_colors())
+        return self.basics
+
+    """The colors the land index says the deck's lands make within the deck's identity, {name: colors}
+       (lands like Command Tower make more than their color identity)"""
+    def produced_colors(self):
+        produced = card_data.get_land_index().produced(name for name, (card, quantity) in self.entries.items()
+                                                       if card.is_land)
+        return {name: [color for color in colors if color in self.identity] for name, colors in produced.items()}
+
+    """Replace some basics with the best nonbasic lands for the colors
+       candidates is a list of nonbasic land Cards to choose from (by default the best ones for the deck's
+       identity from the land index), count the most to add, budget the most to pay for each one,
+       and with 'games' set the choice is made by simulation (see land_base.simulated_score)"""
+    def rec_non_basics(self, candidates=None, count=None, budget=None, games=0, turns=7, seed=0):
+
+        spells, fixed = self.split_library()
+        owned = {card.name for card, quantity in fixed}
+
+        # The index also knows the colors lands like Command Tower make
+        land_index = card_data.get_land_index()
+        if candidates is None:
+            names = [name for name in land_index.candidates(self.identity, budget) if name not in owned]
+            candidates = [card for card in map(Card.get_local_card, names) if card is not None]
+        produced = land_index.produced(card.name for card in candidates)
+
+        candidates = [card for card in candidates if card.name not in owned and card.check_id(self.identity)
+                      and (budget is None or card.price_value <= budget)]
+
+        chosen = land_base.choose_nonbasics(candidates, self.identity_pips(), self.rec_land_count, fixed, count,
+                                            spells, games, turns, seed, produced)
+
+        # The basics make up the rest
+        sources = dict(self.nonbasic_sources)
+        for card in chosen:
+            for color in land_base.land_colors(card, produced):
+                sources[color] += 1
+        self.non_basics = [card.name for card in chosen]
+        self.basics = land_base.allocate_basics(self.identity_pips(), self.rec_land_count,
+                                                self.nonbasic_count + len(chosen), sources)
+
+        return self.non_basics
+
+    """Split the library (everything but the commanders) into the cards the land recommendation
+       leaves alone and the nonbasic lands it builds around, both as (Card, quantity)"""
+    def split_library(self):
+        spells = []
+        fixed = []
+        for card, quantity in self.entries.values():
+            if card in self.commander_cards or "Basic" in card.types and card.is_land:
+                continue
+            (fixed if land_base.is_nonbasic_land(card) else spells).append((card, quantity))
+        return spells, fixed
 
     def __str__(self):
         pass
@@ -296,10 +497,7 @@ class Deck:
     TO-DO:
     - Account for MDFCs in Archidekt
     - Create a list of recommended lands
-        - Manually compile a list of the "best" nonbasics
-        - Replace some basics with non-basics
         - Frank Karsten ratios
-    - Add a budget option - it won't recommend lands over $X
     - str
     - repr
     """
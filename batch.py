@@ -0,0 +1,258 @@
+import argparse
+import csv
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import Card as card_data
+import deck_table
+import decklist
+from Deck import Deck
+from http_client import TokenBucket
+
+"""
+Headless bulk deck analysis
+
+    python batch.py decks/ -o results.csv
+    python batch.py decks.jsonl -o results.jsonl --workers 8
+
+The input is either a directory of "Nx Name" text files or a JSONL file
+with one deck per line:
+    {"name": "...", "commanders": ["...", "..."], "decklist": "1x Sol Ring\\n..."}
+("decklist" may also be a list of lines). In text files, "Commander: <name>"
+lines and the cards under a "Commander:" section header name the commanders,
+otherwise the first card is the commander.
+
+Each worker takes a chunk of decks at a time. Every deck is imported and
+checked on its own, then the statistics of the whole chunk are computed in
+one pass over its cards with a DeckTable (see deck_table.py).
+
+The card data is loaded once in the parent before the worker processes start,
+so on platforms that fork the workers share it copy-on-write. Cards missing
+from it are looked up on Scryfall by the workers, each allowed its share of
+Scryfall's rate limit. A JSONL line that can't be read gets an error row.
+"""
+
+# Columns written for each deck
+FIELDS = ["name", "commanders", "identity", "avg_manavalue", "land_count",
+          "rec_land_count", "basics", "total_price", "unpriced_count", "cheap_count", "warnings",
+          "identity_violations", "unresolved", "malformed", "land_drops", "on_curve_rate", "error"]
+
+# Columns that come from the DeckTable statistics
+TABLE_FIELDS = ("avg_manavalue", "land_count", "rec_land_count", "total_price", "unpriced_count", "cheap_count")
+
+# Fields that hold lists or dictionaries, written as JSON in CSV output
+STRUCTURED = ("basics", "warnings", "identity_violations", "unresolved", "malformed", "land_drops")
+
+
+"""Yield (name, commanders, decklist text) for each deck in a directory or JSONL file,
+   or a result row with the error for a line that isn't a deck"""
+def read_decks(path):
+
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith(".txt"):
+                continue
+            with open(os.path.join(path, filename), "r", encoding="utf-8") as file:
+                commanders, decklist = split_commanders(file.read())
+            yield filename, commanders, decklist
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                deck = json.loads(line)
+                decklist = deck["decklist"]
+                if not isinstance(decklist, str):
+                    decklist = "\n".join(decklist)
+                yield deck.get("name", str(number)), deck["commanders"], decklist
+            except (ValueError, KeyError, TypeError) as e:
+                yield {"name": str(number), "error": f"{type(e).__name__}: {e}"}
+
+
+"""Pull the commanders out of a text decklist, returning them and the remaining lines"""
+def split_commanders(text):
+
+    commanders = []
+    lines = []
+    blocks = [[]]
+    for line in text.splitlines():
+
+        # A blank line ends a commander section (exports put one between the commanders and the deck)
+        if not line.strip():
+            blocks.append([])
+            continue
+
+        # "Commander: <name>" names one, a bare "Commander:" is a section header for the parser
+        key, colon, rest = line.partition(":")
+        if colon and key.strip().lower() == "commander" and rest.strip():
+            commanders.append(rest.strip())
+        else:
+            lines.append(line.strip())
+            blocks[-1].append(line.strip())
+
+    # Cards listed under a commander section (they stay in the list, Deck skips its commanders)
+    for block in blocks:
+        for quantity, name, annotations in decklist.parse_decklist(block):
+            if annotations is not None and annotations.get("section") in ("commander", "commanders") \
+                    and name not in commanders:
+                commanders.append(name)
+
+    # Without any commanders named, the first card is the commander
+    if not commanders:
+        for line in lines:
+            card = decklist.parse_line(line)
+            if card is not None:
+                commanders.append(card[1])
+                break
+
+    return commanders, "\n".join(lines)
+
+
+"""Load the card data, so forked workers inherit it instead of each loading their own"""
+def load_card_data():
+    if card_data.get_card_store() is None:
+        for name in card_data.INDEX_FILES:
+            card_data.get_index(name)
+
+
+"""Set up a worker process: split Scryfall's rate limit between the workers, since each has its own client,
+   and load the card data when it wasn't inherited"""
+def init_worker(workers, load):
+    card_data.scryfall.bucket = TokenBucket(card_data.scryfall.bucket.rate / workers)
+    if load:
+        load_card_data()
+
+
+"""Import and check one deck, also playing 'games' goldfish games with it if asked
+   Returns its result row (without the table's statistics) and the Deck, None if it failed"""
+def analyze(job, games=0):
+
+    # A line that couldn't be read is already its result
+    if isinstance(job, dict):
+        return job, None
+
+    name, commanders, decklist = job
+    result = {"name": name, "commanders": " / ".join(commanders)}
+
+    try:
+        deck = Deck(commanders[0], commanders[1] if len(commanders) > 1 else None)
+        deck.import_decklist_from_text(decklist)
+        result.update(identity=deck.identity,
+                      basics=deck.basics,
+                      warnings=deck.result.warnings,
+                      identity_violations=[name for name, identity in deck.result.identity_violations],
+                      unresolved=deck.result.unresolved,
+                      malformed=deck.result.malformed)
+        if games:
+            simulation = deck.simulate(games)
+            result.update(land_drops=simulation["land_drops"],
+                          on_curve_rate=simulation["on_curve_rate"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result, None
+
+    return result, deck
+
+
+"""Analyze a chunk of decks in a worker process, computing their statistics together"""
+def analyze_chunk(jobs, games=0):
+
+    results = []
+    decks = []
+    for job in jobs:
+        result, deck = analyze(job, games)
+        results.append(result)
+        if deck is not None:
+            decks.append((result, deck))
+
+    if decks:
+        stats = deck_table.analyze_decks([deck for result, deck in decks], Deck.missing_price)
+        for (result, deck), deck_stats in zip(decks, stats):
+            result.update({field: deck_stats[field] for field in TABLE_FIELDS})
+
+    return results
+
+
+"""Group an iterable into lists of 'size' items"""
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+"""Write results as CSV or JSONL as they arrive"""
+class ResultWriter:
+
+    def __init__(self, file, output_format):
+        self.file = file
+        self.output_format = output_format
+        if output_format == "csv":
+            self.writer = csv.DictWriter(file, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, result):
+        if self.output_format == "csv":
+            row = dict(result)
+            for field in STRUCTURED:
+                if field in row:
+                    row[field] = json.dumps(row[field])
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(result) + "\n")
+
+
+"""Analyze every deck across a process pool, streaming the results, and return (decks, seconds)"""
+def run_batch(source, output, output_format, workers, chunksize=8, games=0):
+
+    load_card_data()
+
+    # Fork where we can so the workers share the card data that's already loaded
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    start = time.perf_counter()
+    count = 0
+    with context.Pool(workers, initializer=init_worker, initargs=(workers, "fork" not in methods)) as pool:
+        writer = ResultWriter(output, output_format)
+        chunks = chunked(read_decks(source), chunksize)
+        for results in pool.imap_unordered(functools.partial(analyze_chunk, games=games), chunks):
+            for result in results:
+                writer.write(result)
+                count += 1
+
+    return count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze many decklists at once")
+    parser.add_argument("source", help="Directory of 'Nx Name' .txt files, or a .jsonl file of decks")
+    parser.add_argument("-o", "--output", help="Where to write the results (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"],
+                        help="Output format (default: from the output file's extension, otherwise jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=8, help="Decks a worker analyzes together")
+    parser.add_argument("--simulate", type=int, default=0, metavar="GAMES",
+                        help="Also play this many goldfish games per deck (land drops and on curve rate)")
+    args = parser.parse_args()
+
+    output_format = args.format or ("csv" if args.output and args.output.endswith(".csv") else "jsonl")
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+
+    try:
+        count, elapsed = run_batch(args.source, output, output_format, args.workers, args.chunksize, args.simulate)
+    finally:
+        if args.output:
+            output.close()
+
+    print(f"Analyzed {count} decks in {elapsed:.2f}s ({count / elapsed:,.1f} decks/s)", file=sys.stderr)
@@ -0,0 +1,400 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from Card import Card, iter_json_array
+from card_format import FORMATS, read_card_file, write_card_file
+import card_store as store
+import grab_from_archidekt as Arch
+import decklist
+
+
+"""Write a synthetic Scryfall bulk file with several printings of every card name"""
+def write_synthetic_bulk(path, printings, unique_names):
+
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("[")
+        for i in range(printings):
+            card = {"object": "card",
+                    "id": f"{i:08d}",
+                    "name": f"Card {i % unique_names}",
+                    "mana_cost": "{2}{G}{G}",
+                    "cmc": 4.0,
+                    "color_identity": ["G"],
+                    "type_line": "Creature — Elf Druid",
+                    "oracle_text": "Lorem ipsum " * 40,
+                    "prices": {"usd": None if i % 7 == 0 else f"{rng.uniform(0.1, 50):.2f}"}}
+            if i:
+                file.write(",\n")
+            json.dump(card, file)
+        file.write("]")
+
+
+"""Read a file as a stream of byte chunks, the way a streamed HTTP response is consumed"""
+def iter_file_chunks(path, chunk_size=1 << 20):
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+"""Run a function, returning its result, the elapsed time and the peak traced memory"""
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+"""Compare the full json.load reduction against the streaming one on a synthetic bulk file"""
+def bench_bulk(printings, unique_names):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bulk.json")
+        write_synthetic_bulk(path, printings, unique_names)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"Synthetic bulk file: {printings} printings, {unique_names} names, {size_mb:.1f} MB")
+
+        def full():
+            with open(path, "r", encoding="utf-8") as file:
+                return Card.reduce_cheapest(json.load(file))
+
+        def streamed():
+            return Card.reduce_cheapest(iter_json_array(iter_file_chunks(path)))
+
+        for label, func in (("json.load", full), ("streaming", streamed)):
+            result, elapsed, peak = measure(func)
+            print(f"{label:>10}: {len(result)} names, {elapsed:.2f}s, "
+                  f"{printings / elapsed:,.0f} cards/s, peak {peak / 1e6:.1f} MB")
+
+
+"""Per-card memory and the cost of the checks Deck.det_stats makes for every card"""
+def bench_card(decks):
+
+    costs = ["{2}{G}{G}", "{W}{U}", "{1}{B}", "{R}", "", "{3}{W}{W}"]
+    identities = [["G"], ["W", "U"], ["B"], ["R"], [], ["W"]]
+
+    def build(count):
+        return [Card(f"Card {i}", costs[i % 6], i % 7, identities[i % 6], "0.25",
+                     "Land" if i % 3 == 0 else "Creature", kind=i % 16)
+                for i in range(count)]
+
+    cards, elapsed, peak = measure(lambda: build(100000))
+    print(f"build 100k cards: {elapsed:.2f}s, {peak / len(cards):.0f} bytes per card")
+
+    deck = cards[:100]
+
+    def analyze():
+        pips = [0, 0, 0, 0, 0]
+        for _ in range(decks):
+            for card in deck:
+                card.check_id("WUB")
+                card.is_cheap()
+                card.is_mdfc()
+                if not card.is_land:
+                    for i, count in enumerate(card.pips):
+                        pips[i] += count
+        return pips
+
+    start = time.perf_counter()
+    analyze()
+    elapsed = time.perf_counter() - start
+    print(f"analyze {decks} decks of 100 cards: {elapsed:.2f}s, {decks / elapsed:,.0f} decks/s")
+
+
+"""Disk size and load time of the card files in each format, against the old indented full-card JSON"""
+def bench_formats(count):
+
+    rng = random.Random(0)
+    cards = [{"object": "card",
+              "id": f"{i:08d}-0000-0000-0000-000000000000",
+              "oracle_id": f"{i:08d}-1111-1111-1111-111111111111",
+              "name": f"Card {i}",
+              "lang": "en",
+              "released_at": "2020-01-01",
+              "uri": f"https://api.scryfall.com/cards/{i}",
+              "image_uris": {size: f"https://cards.scryfall.io/{size}/front/{i}.jpg"
+                             for size in ("small", "normal", "large", "png", "art_crop", "border_crop")},
+              "mana_cost": "{2}{G}{G}",
+              "cmc": 4.0,
+              "type_line": "Creature — Elf Druid",
+              "oracle_text": "Lorem ipsum dolor sit amet. " * 8,
+              "colors": ["G"],
+              "color_identity": ["G"],
+              "legalities": {fmt: "legal" for fmt in ("standard", "pioneer", "modern", "legacy", "vintage",
+                                                      "commander", "oathbreaker", "pauper", "brawl", "historic")},
+              "set": "abc",
+              "rarity": "common",
+              "artist": "Someone",
+              "prices": {"usd": f"{rng.uniform(0.1, 50):.2f}", "usd_foil": None, "eur": "0.10", "tix": "0.02"}}
+             for i in range(count)]
+
+    formats = [data_format for data_format in FORMATS if data_format != "msgpack"]
+    try:
+        import msgpack
+        formats.append("msgpack")
+    except ImportError:
+        print("msgpack isn't installed, skipping that format")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "old.json")
+        with open(old_path, "w", encoding="utf-8") as file:
+            json.dump(cards, file, indent=2)
+
+        def load_old():
+            with open(old_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+
+        results = [("indented full JSON", old_path, load_old)]
+        for data_format in formats:
+            path = os.path.join(tmp, f"{data_format}.dat")
+            write_card_file(path, cards, data_format=data_format)
+            results.append((data_format, path, lambda path=path: read_card_file(path)))
+
+        for label, path, load in results:
+            start = time.perf_counter()
+            loaded = load()
+            elapsed = time.perf_counter() - start
+            print(f"{label:>18}: {os.path.getsize(path) / 1e6:7.2f} MB, load {elapsed * 1000:7.1f} ms ({len(loaded)} cards)")
+
+
+"""An Archidekt search page and the matching JSON search response, shaped like recorded ones"""
+def search_fixtures(count):
+
+    decks = [{"id": 1000000 + i,
+              "name": f"Deck {i}",
+              "size": 100,
+              "updatedAt": f"2026-10-{1 + i % 28:02d}T12:00:00.000000Z",
+              "createdAt": "2026-01-01T12:00:00.000000Z",
+              "deckFormat": 3,
+              "edhBracket": 3,
+              "featured": f"https://storage.googleapis.com/topdekt-user/images/{i}.jpg",
+              "customFeatured": "",
+              "viewCount": i * 13,
+              "private": False,
+              "unlisted": False,
+              "theorycrafted": False,
+              "game": None,
+              "hasDescription": True,
+              "tags": [],
+              "parentFolderId": 1,
+              "owner": {"id": 42, "username": "someone", "avatar": "", "frame": None,
+                        "ckAffiliate": "", "tcgAffiliate": "", "referrerEnum": None},
+              "colors": {"W": 10, "U": 12, "B": 8, "R": 0, "G": 15}}
+             for i in range(count)]
+    json_text = json.dumps({"count": count, "next": None, "results": decks})
+
+    # The search page wraps every result in a card of markup, among the site's scripts and navigation
+    page = ['<!DOCTYPE html><html><head><title>Search Decks | Archidekt</title>',
+            '<script>' + "window.__config={};" * 2000 + '</script></head><body>',
+            '<nav>' + ''.join(f'<a href="/search/{section}">{section}</a>' for section in range(200)) + '</nav>',
+            '<div class="searchResults">']
+    for deck in decks:
+        page.append(f'<div class="deckCard"><div class="deckCard_image" style="background-image:url({deck["featured"]})"></div>'
+                    f'<a class="deckCard_link" href="/decks/{deck["id"]}/deck-{deck["id"]}">{deck["name"]}</a>'
+                    f'<div class="deckCard_info"><span>{deck["size"]} cards</span>'
+                    f'<a href="/u/{deck["owner"]["username"]}">{deck["owner"]["username"]}</a>'
+                    f'<span class="updated">{deck["updatedAt"]}</span>'
+                    + ''.join(f'<i class="ms ms-{color.lower()}"></i>' for color in deck["colors"])
+                    + '</div></div>')
+    page.append('</div><footer>' + '<p>Archidekt</p>' * 200 + '</footer></body></html>')
+
+    return "".join(page), json_text
+
+
+"""Compare parsing the html search page against the JSON search response"""
+def bench_search(count, runs):
+
+    html_text, json_text = search_fixtures(count)
+
+    results = [("html + BeautifulSoup", len(html_text), lambda: Arch.parse_search_html(html_text)),
+               ("JSON API", len(json_text), lambda: Arch.parse_search_json(json.loads(json_text)))]
+    for label, size, parse in results:
+        decks, _, peak = measure(parse)
+        elapsed = min(time_call(parse) for _ in range(runs))
+        print(f"{label:>20}: {size / 1e3:7.1f} KB, parse {elapsed * 1000:7.2f} ms, "
+              f"peak {peak / 1e6:5.1f} MB ({len(decks)} decks)")
+
+
+"""Compare the old split based line parsing against the decklist parser on a file of 'lines' lines"""
+def bench_decklist(lines, names):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "decklist.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            for i in range(lines):
+                file.write(f"{1 + i % 4}x Card Name {i % names}\n")
+        print(f"Decklist: {lines:,} lines, {names} distinct names, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        def old():
+            entries = []
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    quantity = int(line.split("x ")[0])
+                    name = "".join(line.split("x ", 1)[1:]).strip()
+                    entries.append((quantity, name))
+            return entries
+
+        def parsed():
+            with open(path, "r", encoding="utf-8") as file:
+                return list(decklist.parse_decklist(file))
+
+        def aggregated():
+            with open(path, "r", encoding="utf-8") as file:
+                return decklist.read_decklist(file)[0]
+
+        for label, func in (("split (old)", old), ("parse_decklist", parsed), ("read_decklist", aggregated)):
+            result, elapsed, peak = measure(func)
+            elapsed = time_call(func)
+            print(f"{label:>15}: {len(result):,} entries, {elapsed:.2f}s, "
+                  f"{lines / elapsed:,.0f} lines/s, peak {peak / 1e6:.1f} MB")
+
+
+"""Goldfish games per second on a synthetic 99 card library (37 lands, 2 mdfcs, 60 spells)"""
+def bench_simulate(games, turns):
+
+    import simulation
+
+    spells = [Card(f"Spell {i}", ["{G}", "{1}{U}", "{2}{G}{U}", "{3}{U}{U}"][i % 4], 1 + i % 4,
+                   ["G", "U"], "0.25", "Creature", kind=0) for i in range(60)]
+    lands = [Card("Forest", "", 0, [], "0.05", "Basic Land — Forest", kind=0),
+             Card("Island", "", 0, [], "0.05", "Basic Land — Island", kind=0),
+             Card("Untapped Mdfc", "{1}{G}", 2, ["G"], "1.00", "Sorcery // Land", kind=store.MDFC_UNTAPPED),
+             Card("Tapped Mdfc", "{3}{U}", 4, ["U"], "1.00", "Instant // Land", kind=store.MDFC_TAPPED)]
+    entries = {card.name: [card, 1] for card in spells}
+    entries.update({"Forest": [lands[0], 19], "Island": [lands[1], 18],
+                    "Untapped Mdfc": [lands[2], 1], "Tapped Mdfc": [lands[3], 1]})
+    deck = SimpleNamespace(commander_cards=[], entries=entries)
+
+    start = time.perf_counter()
+    result = simulation.simulate(deck, games, turns, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"{games:,} games of {turns} turns: {elapsed:.2f}s, {games / elapsed:,.0f} games/s")
+    print(f"land drops by turn: {result['land_drops']}, on curve rate {result['on_curve_rate']}")
+
+
+"""Land index build time, file size and lookups against a scan over every land, on 'count' synthetic lands"""
+def bench_lands(count, lookups):
+
+    import land_index
+
+    rng = random.Random(0)
+    cards = []
+    for i in range(count):
+        identity = rng.sample(store.COLORS, rng.choice([1, 2, 2, 3]))
+        cards.append({"name": f"Land {i}", "type_line": "Land", "color_identity": identity,
+                      "produced_mana": identity, "prices": {"usd": f"{rng.lognormvariate(0, 1.5):.2f}"},
+                      "oracle_text": rng.choice(["", "Land enters tapped.", "Land enters tapped unless you control a Forest."])})
+
+    start = time.perf_counter()
+    index = land_index.build_land_index(cards)
+    print(f"build: {count:,} lands in {time.perf_counter() - start:.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, land_index.INDEX_FILE)
+        index.save(path)
+        start = time.perf_counter()
+        land_index.load_land_index(path)
+        print(f"file: {os.path.getsize(path) / 1e3:.1f} KB, load {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    queries = [("".join(rng.sample(store.COLORS, rng.randint(1, 5))), rng.choice([None, 1, 5, 20]))
+               for _ in range(lookups)]
+
+    def scan(identity, budget):
+        mask = store.identity_to_bits(identity)
+        fits = [(land_index.quality(land[2], land[4], land[5], mask), -land[1], land[0]) for land in index.lands
+                if not land[3] & ~mask and land[2] & mask and (budget is None or land[1] <= budget)]
+        return [name for score, price, name in sorted(fits, reverse=True)[:land_index.TOP_COUNT]]
+
+    for label, func in (("scan", scan), ("index", index.candidates)):
+        elapsed = time_call(lambda: [func(identity, budget) for identity, budget in queries])
+        print(f"{label:>6}: {elapsed / lookups * 1e6:8.1f} us a lookup")
+
+
+"""How long a call takes (without tracing memory)"""
+def time_call(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+"""Time a cold 'import Card' in a fresh interpreter, using the card data in the current directory"""
+def bench_import(runs):
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])))
+
+    # Startup of the interpreter alone, so it can be subtracted
+    baseline = min(time_command([sys.executable, "-c", "import requests, json"], env) for _ in range(runs))
+    cold = min(time_command([sys.executable, "-c", "import Card"], env) for _ in range(runs))
+    print(f"interpreter + requests: {baseline * 1000:.1f} ms")
+    print(f"import Card:            {cold * 1000:.1f} ms ({(cold - baseline) * 1000:.1f} ms for Card itself)")
+
+
+"""Run a command and return how long it took"""
+def time_command(command, env):
+    start = time.perf_counter()
+    subprocess.run(command, env=env, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the card data pipeline")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    bulk = sub.add_parser("bulk", help="Bulk download reduction: memory and throughput")
+    bulk.add_argument("--printings", type=int, default=100000)
+    bulk.add_argument("--names", type=int, default=5000)
+
+    cold_import = sub.add_parser("import", help="Cold import time of the Card module")
+    cold_import.add_argument("--runs", type=int, default=5)
+
+    card = sub.add_parser("card", help="Card memory and per-card checks")
+    card.add_argument("--decks", type=int, default=10000)
+
+    formats = sub.add_parser("formats", help="Card file size and load time per format")
+    formats.add_argument("--cards", type=int, default=30000)
+
+    search = sub.add_parser("search", help="Archidekt deck search: html scraping against the JSON API")
+    search.add_argument("--decks", type=int, default=60)
+    search.add_argument("--runs", type=int, default=5)
+
+    lines = sub.add_parser("decklist", help="Decklist line parsing throughput")
+    lines.add_argument("--lines", type=int, default=1000000)
+    lines.add_argument("--names", type=int, default=5000)
+
+    simulate = sub.add_parser("simulate", help="Goldfish simulation throughput")
+    simulate.add_argument("--games", type=int, default=500000)
+    simulate.add_argument("--turns", type=int, default=7)
+
+    lands = sub.add_parser("lands", help="Nonbasic land index build and lookups")
+    lands.add_argument("--lands", type=int, default=5000)
+    lands.add_argument("--lookups", type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.bench == "bulk":
+        bench_bulk(args.printings, args.names)
+    elif args.bench == "import":
+        bench_import(args.runs)
+    elif args.bench == "card":
+        bench_card(args.decks)
+    elif args.bench == "formats":
+        bench_formats(args.cards)
+    elif args.bench == "search":
+        bench_search(args.decks, args.runs)
+    elif args.bench == "decklist":
+        bench_decklist(args.lines, args.names)
+    elif args.bench == "simulate":
+        bench_simulate(args.games, args.turns)
+    elif args.bench == "lands":
+        bench_lands(args.lands, args.lookups)
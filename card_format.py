@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+
+"""
+How the downloaded card files are stored
+
+Only the fields the analyzer reads are kept (plus any opt-in extras, and the
+oracle text of lands for the land index), and the files are written without
+indentation in one of three formats:
+    "json"     - a minified list of card objects
+    "columnar" - a minified JSON object with one list per field
+    "msgpack"  - a msgpack list of card objects (needs the msgpack package)
+
+The file names stay the same whatever the format; read_card_file works out
+which one it's looking at from the first byte.
+"""
+
+# Format used when writing, see above
+DATA_FORMAT = "json"
+
+# Fields every card keeps
+FIELDS = ["id", "name", "mana_cost", "cmc", "color_identity", "type_line", "prices", "produced_mana"]
+
+# Fields only lands keep (the land index reads whether they enter tapped from the oracle text)
+LAND_FIELDS = ["oracle_text"]
+
+# Extra Scryfall fields to keep, e.g. ["oracle_text", "keywords"]
+EXTRA_FIELDS = []
+
+FORMATS = ("json", "columnar", "msgpack")
+
+
+"""Keep only the fields we use from a Scryfall card (and only the usd price)"""
+def project_card(card, extra_fields=None):
+
+    fields = FIELDS + (EXTRA_FIELDS if extra_fields is None else extra_fields)
+    if "Land" in card.get("type_line", ""):
+        fields = fields + LAND_FIELDS
+
+    projected = {}
+    for field in fields:
+        if field in card:
+            projected[field] = card[field]
+
+    if "prices" in projected:
+        projected["prices"] = {"usd": projected["prices"].get("usd")}
+
+    return projected
+
+
+"""Write a list of cards to a file in the given format"""
+def write_card_file(path, cards, data_format=None, extra_fields=None):
+
+    data_format = data_format or DATA_FORMAT
+    if data_format not in FORMATS:
+        raise ValueError(f"Unknown data format '{data_format}', expected one of {FORMATS}")
+
+    cards = [project_card(card, extra_fields) for card in cards]
+
+    if data_format == "msgpack":
+        import msgpack
+        data = msgpack.packb(cards, use_bin_type=True)
+    elif data_format == "columnar":
+        data = json.dumps(to_columns(cards), separators=(",", ":")).encode("utf-8")
+    else:
+        data = json.dumps(cards, separators=(",", ":")).encode("utf-8")
+
+    write_atomic(path, data)
+
+
+"""Write bytes (or text, as UTF-8) to a file by way of a temporary file in the same directory,
+   so anything reading the file never sees it half-written"""
+def write_atomic(path, data):
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".tmp", delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
+
+
+"""Read a list of cards from a file written in any of the formats (or by older versions, with indentation)"""
+def read_card_file(path):
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    start = data.lstrip()[:1]
+    if start in (b"[", b"{"):
+        cards = json.loads(data)
+    elif not start:
+        return []
+    else:
+        import msgpack
+        cards = msgpack.unpackb(data, raw=False)
+
+    if isinstance(cards, dict):
+        # Either a columnar file or an empty placeholder
+        return from_columns(cards) if "columns" in cards else list(cards.values())
+    return cards
+
+
+"""Turn a list of cards into one list per field (prices become a 'usd' column)"""
+def to_columns(cards):
+
+    fields = []
+    for card in cards:
+        for field in card:
+            if field not in fields:
+                fields.append(field)
+
+    columns = {}
+    for field in fields:
+        if field == "prices":
+            columns["usd"] = [card.get("prices", {}).get("usd") for card in cards]
+        else:
+            columns[field] = [card.get(field) for card in cards]
+
+    return {"columns": columns, "count": len(cards)}
+
+
+"""Turn a columnar file back into a list of cards"""
+def from_columns(data):
+
+    columns = data["columns"]
+    cards = [{} for _ in range(data["count"])]
+
+    for field, values in columns.items():
+        for card, value in zip(cards, values):
+            if value is None and field != "usd":
+                continue
+            if field == "usd":
+                card["prices"] = {"usd": value}
+            else:
+                card[field] = value
+
+    return cards
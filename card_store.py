@@ -0,0 +1,200 @@
+import mmap
+import os
+import struct
+import sys
+
+from card_format import read_card_file, write_atomic
+
+"""
+Compact, memory-mapped card store
+
+The store is a single binary file:
+    header  - magic, record count
+    records - one fixed-width record per card name, sorted by the name's UTF-8 bytes
+    heap    - the UTF-8 text the records point into (name, mana cost, type line)
+
+Looking a card up is a binary search over the records, so only the pages
+that are touched get read, and the file is shared between every process
+that maps it.
+"""
+
+STORE_FILE = "cards.bin"
+
+MAGIC = b"EDHCARD1"
+HEADER = struct.Struct("<8sI")
+
+# name offset/length, cost offset/length, type offset/length,
+# cmc, price in cents, color identity bits, kind flags
+RECORD = struct.Struct("<IHIHIHfIBB")
+
+NO_PRICE = 0xFFFFFFFF
+
+# Color identity bits, in WUBRG order
+COLORS = "WUBRG"
+COLOR_BITS = {color: 1 << i for i, color in enumerate(COLORS)}
+
+# Kind flags
+CHEAP = 1
+MDFC_TAPPED = 2
+MDFC_UNTAPPED = 4
+DFC = 8
+
+
+"""Convert a list of color letters to a bitmask"""
+def identity_to_bits(identity):
+    bits = 0
+    for color in identity:
+        bits |= COLOR_BITS.get(color, 0)
+    return bits
+
+
+"""Convert a bitmask back to a list of color letters"""
+def bits_to_identity(bits):
+    return [color for color in COLORS if bits & COLOR_BITS[color]]
+
+
+"""Compile card data into a store file
+   cards is an iterable of Scryfall card dicts,
+   kinds maps a card name to its kind flags"""
+def build_card_store(cards, kinds=None, path=STORE_FILE):
+
+    kinds = kinds or {}
+    heap = bytearray()
+    strings = {}
+
+    # Store each distinct string once
+    def add_string(text):
+        data = text.encode("utf-8")
+        if data not in strings:
+            strings[data] = len(heap)
+            heap.extend(data)
+        return strings[data], len(data)
+
+    # Every name only gets one record, and cards only listed in the smaller files still get one
+    by_name = {}
+    for card in cards:
+        by_name.setdefault(card["name"], card)
+
+    records = []
+    for name in sorted(by_name, key=lambda n: n.encode("utf-8")):
+        card = by_name[name]
+        price = (card.get("prices") or {}).get("usd")
+        price_cents = NO_PRICE if price is None else round(float(price) * 100)
+
+        records.append(RECORD.pack(*add_string(name),
+                                   *add_string(card.get("mana_cost", "N/A")),
+                                   *add_string(card.get("type_line", "Unknown type")),
+                                   card.get("cmc", 0),
+                                   price_cents,
+                                   identity_to_bits(card.get("color_identity", [])),
+                                   kinds.get(name, 0)))
+
+    write_atomic(path, b"".join([HEADER.pack(MAGIC, len(records))] + records + [heap]))
+
+    return len(records)
+
+
+"""Compile the downloaded card files into a store file"""
+def build_from_json(path=STORE_FILE):
+
+    bulk = read_card_file("scryfall_all.json")
+    kinds = {}
+    extra = []
+    for filename, flag in (("cheap_list.json", CHEAP),
+                           ("mdfc_tapped.json", MDFC_TAPPED),
+                           ("mdfc_untapped.json", MDFC_UNTAPPED),
+                           ("dfc.json", DFC)):
+        for card in read_card_file(filename):
+            kinds[card["name"]] = kinds.get(card["name"], 0) | flag
+            extra.append(card)
+
+    return build_card_store(bulk + extra, kinds, path)
+
+
+class CardStore:
+
+    """Map a store file into memory"""
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not a card store")
+        self.heap_start = HEADER.size + self.count * RECORD.size
+
+    """Read the raw record at a position"""
+    def _record(self, i):
+        return RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)
+
+    """Read a string out of the heap"""
+    def _text(self, offset, length):
+        start = self.heap_start + offset
+        return self.data[start:start + length]
+
+    """Binary search for a name, returning its record or None"""
+    def _find(self, name):
+        key = name.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            record = self._record(mid)
+            current = self._text(record[0], record[1])
+            if current < key:
+                low = mid + 1
+            elif current > key:
+                high = mid
+            else:
+                return record
+        return None
+
+    """Return a card in the same shape as Scryfall's data, or None"""
+    def get(self, name):
+        record = self._find(name)
+        if record is None:
+            return None
+
+        prices = {}
+        if record[7] != NO_PRICE:
+            prices["usd"] = f"{record[7] / 100:.2f}"
+
+        return {"name": self._text(record[0], record[1]).decode("utf-8"),
+                "mana_cost": self._text(record[2], record[3]).decode("utf-8"),
+                "type_line": self._text(record[4], record[5]).decode("utf-8"),
+                "cmc": record[6],
+                "prices": prices,
+                "color_identity": bits_to_identity(record[8])}
+
+    """Return the kind flags of a card (0 if it isn't in the store)"""
+    def kind(self, name):
+        record = self._find(name)
+        return 0 if record is None else record[9]
+
+    """Every card name in the store, in sorted order"""
+    def names(self):
+        for i in range(self.count):
+            record = self._record(i)
+            yield self._text(record[0], record[1]).decode("utf-8")
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+
+
+"""Open the store if it has been built, otherwise return None"""
+def open_card_store(path=STORE_FILE):
+    if not os.path.exists(path):
+        return None
+    return CardStore(path)
+
+
+if __name__ == "__main__":
+    count = build_from_json(sys.argv[1] if len(sys.argv) > 1 else STORE_FILE)
+    print(f"Compiled {count} cards into the card store.")
@@ -0,0 +1,55 @@
+import json
+import time
+
+from sqlite_cache import SqliteCache
+
+"""
+Persistent cache for Archidekt deck JSON
+
+Decks are kept by id in a small SQLite file together with their updatedAt
+value and whatever validators Archidekt sent (ETag / Last-Modified), so a
+cached deck can be reused when it hasn't changed since it was fetched. Once
+the cache is full the least recently used decks are dropped.
+"""
+
+CACHE_FILE = "deck_cache.sqlite"
+
+
+class DeckCache(SqliteCache):
+
+    table = "decks"
+    key = "deck_id"
+    key_type = "INTEGER"
+    columns = """data TEXT NOT NULL,
+                 updated_at TEXT,
+                 etag TEXT,
+                 last_modified TEXT"""
+
+    def __init__(self, path=CACHE_FILE, max_entries=500):
+        super().__init__(path, max_entries)
+
+    """Look a deck up, returning a dictionary with its data, updated_at, etag and last_modified, or None"""
+    def lookup(self, deck_id):
+
+        with self.lock:
+            row = self.db.execute("SELECT data, updated_at, etag, last_modified FROM decks WHERE deck_id = ?",
+                                  (deck_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.touch(deck_id)
+            self.hits += 1
+
+        return {"data": json.loads(row[0]), "updated_at": row[1], "etag": row[2], "last_modified": row[3]}
+
+    """Remember a deck along with the validators it came with"""
+    def store(self, deck_id, data, etag=None, last_modified=None):
+
+        with self.lock:
+            self.db.execute("""INSERT OR REPLACE INTO decks (deck_id, data, updated_at, etag, last_modified, last_used)
+                               VALUES (?, ?, ?, ?, ?, ?)""",
+                            (deck_id, json.dumps(data, separators=(",", ":")), data.get("updatedAt"),
+                             etag, last_modified, time.time()))
+            self.evict()
+            self.db.commit()
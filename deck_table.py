@@ -0,0 +1,149 @@
+import numpy as np
+
+import card_store as store
+
+"""
+Columnar deck statistics
+
+DeckTable lays every card slot of one or many decks out as NumPy columns
+(price, mana value, pips, land flag, mdfc kind, identity mask, ...) and
+computes the same statistics as Deck.det_stats for all of the decks at once,
+with grouped array reductions instead of a Python loop per card.
+
+batch.py computes the statistics it reports through here, a chunk of decks
+at a time. A deck without spells has an average mana value of 0, as in
+Deck.det_stats.
+
+Missing prices are NaN in the price column. The missing_price policy decides
+what the totals do with them, the same way Deck.missing_price does:
+    "skip"  - leave them out of the total (they're counted in unpriced_count)
+    "nan"   - that deck's total becomes NaN
+    "raise" - raise a ValueError
+"""
+
+# Statistics that are whole numbers of cards
+COUNTS = ("spell_count", "land_count", "unpriced_count", "mdfc_count", "mdfc_tapped",
+          "mdfc_untapped", "cheap_count", "identity_violations")
+
+# Values of the mdfc_kind column
+NOT_MDFC = 0
+MDFC_TAPPED = 1
+MDFC_UNTAPPED = 2
+DFC = 3
+
+
+"""Collapse a card's kind flags into one mdfc_kind value, the same way Card.is_mdfc does"""
+def mdfc_kind(kind):
+    if kind & store.MDFC_TAPPED:
+        return MDFC_TAPPED
+    if kind & store.MDFC_UNTAPPED:
+        return MDFC_UNTAPPED
+    if kind & store.DFC:
+        return DFC
+    return NOT_MDFC
+
+
+class DeckTable:
+
+    """Build the columns for a list of Deck objects"""
+    def __init__(self, decks):
+
+        self.decks = list(decks)
+        self.deck_count = len(self.decks)
+
+        # One row per distinct card in each deck, weighted by its quantity
+        rows = [(deck_number, card, quantity)
+                for deck_number, deck in enumerate(self.decks)
+                for card, quantity in deck.entries.values()]
+
+        self.deck = np.fromiter((row[0] for row in rows), dtype=np.int32, count=len(rows))
+        self.quantity = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        self.price = np.fromiter((row[1].price_value for row in rows), dtype=np.float64, count=len(rows))
+        self.manavalue = np.fromiter((row[1].manavalue for row in rows), dtype=np.float64, count=len(rows))
+        self.is_land = np.fromiter((row[1].is_land for row in rows), dtype=bool, count=len(rows))
+        self.is_cheap = np.fromiter((row[1].kind & store.CHEAP for row in rows), dtype=bool, count=len(rows))
+        self.mdfc_kind = np.fromiter((mdfc_kind(row[1].kind) for row in rows), dtype=np.int8, count=len(rows))
+        self.id_mask = np.fromiter((row[1].id_mask for row in rows), dtype=np.uint8, count=len(rows))
+        self.pips = np.array([row[1].pips for row in rows], dtype=np.float64).reshape(len(rows), 5)
+
+        # Per deck columns
+        self.commander_count = np.array([len(deck.commander) for deck in self.decks], dtype=np.float64)
+        self.deck_mask = np.array([store.identity_to_bits(deck.identity) for deck in self.decks], dtype=np.uint8)
+
+    """Sum a per-row column for each deck"""
+    def per_deck(self, values):
+        return np.bincount(self.deck, weights=values, minlength=self.deck_count)
+
+    """Compute the statistics of every deck, returning a dictionary of arrays with one entry per deck"""
+    def stats(self, missing_price="skip"):
+
+        quantity = self.quantity
+        spell = ~self.is_land
+
+        # Prices
+        unpriced = np.isnan(self.price)
+        unpriced_count = self.per_deck(quantity * unpriced)
+        if missing_price == "raise" and unpriced.any():
+            raise ValueError(f"{int(unpriced_count.sum())} cards have no price")
+        total_price = self.per_deck(np.where(unpriced, 0.0, self.price) * quantity)
+        if missing_price == "nan":
+            total_price[unpriced_count > 0] = np.nan
+
+        # Spells, their mana values and pips
+        spell_count = self.per_deck(quantity * spell)
+        avg_manavalue = np.divide(self.per_deck(self.manavalue * quantity * spell), spell_count,
+                                  out=np.zeros(self.deck_count), where=spell_count > 0)
+        pip_weights = self.pips * (quantity * spell)[:, None]
+        pip_count = np.stack([self.per_deck(pip_weights[:, i]) for i in range(5)], axis=1)
+
+        # Mdfcs and lands (counted the same way as Deck.tally and Deck.det_stats)
+        mdfc_tapped = self.per_deck(quantity * (self.mdfc_kind == MDFC_TAPPED))
+        mdfc_untapped = self.per_deck(quantity * (self.mdfc_kind == MDFC_UNTAPPED))
+        dfc = self.per_deck(quantity * (self.mdfc_kind == DFC))
+        mdfc_count = mdfc_tapped + mdfc_untapped + dfc
+        land_count = self.per_deck(quantity * self.is_land) - dfc - mdfc_count
+
+        cheap_count = self.per_deck(quantity * self.is_cheap)
+
+        # Frank Karsten's formula, as in Deck.det_land_count
+        rec_land_count = (100 - self.commander_count) / 60
+        rec_land_count *= 19.59 + (1.9 * np.round(avg_manavalue, 2)) + 0.27
+        rec_land_count -= (0.28 * cheap_count) - 1.35
+
+        # Cards outside their deck's color identity
+        outside = (self.id_mask & ~self.deck_mask[self.deck]) != 0
+        identity_violations = self.per_deck(quantity * outside)
+
+        return {"avg_manavalue": np.round(avg_manavalue, 2),
+                "spell_count": spell_count,
+                "land_count": land_count,
+                "total_price": np.round(total_price, 2),
+                "unpriced_count": unpriced_count,
+                "pip_count": pip_count,
+                "mdfc_count": mdfc_count,
+                "mdfc_tapped": mdfc_tapped,
+                "mdfc_untapped": mdfc_untapped,
+                "cheap_count": cheap_count,
+                "rec_land_count": np.round(rec_land_count, 2),
+                "identity_violations": identity_violations}
+
+
+"""Analyze many decks at once, returning one dictionary of plain values per deck"""
+def analyze_decks(decks, missing_price="skip"):
+
+    table = DeckTable(decks)
+    stats = table.stats(missing_price)
+
+    results = []
+    for i, deck in enumerate(table.decks):
+        result = {"commander": deck.commander, "identity": deck.identity}
+        for key, values in stats.items():
+            if key == "pip_count":
+                result[key] = dict(zip(store.COLORS, values[i].astype(int).tolist()))
+            elif key in COUNTS:
+                result[key] = int(values[i])
+            else:
+                result[key] = values[i].item()
+        results.append(result)
+
+    return results
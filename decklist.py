@@ -0,0 +1,136 @@
+import re
+
+"""
+Decklist text parsing
+
+Every import reads "quantity name" lines through here. A line may spell the
+quantity "1x", "1 x", "1X" or just "1", and may end with the annotations other
+sites add when exporting:
+    "(C21) 263"  - set code and collector number
+    "*F*"        - foil/etched markers
+    "[Ramp]"     - categories
+    "^Have^"     - Archidekt labels
+Section headers ("Commander:", "// Sideboard", "Creatures (30)", ...) are
+recognized and blank lines are skipped; anything else that doesn't parse is
+reported back instead of raising.
+"""
+
+# The quantity and everything after it
+LINE = re.compile(r"\s*(\d+)\s*[xX]?\s+(.*\S)")
+
+# Annotations at the end of what follows the quantity (only tried when there's a '(', '*', '[' or '^')
+ANNOTATED = re.compile(r"""(?P<name>.+?)
+                           (?:\s+\((?P<set>[A-Za-z0-9]{2,6})\)(?:\s+(?P<number>[A-Za-z0-9-]+))?)?
+                           (?P<markers>(?:\s+\*[A-Za-z]+\*)*)
+                           (?P<tags>(?:\s+\[[^\]]*\])*)
+                           (?:\s+\^[^^]*\^)?""", re.VERBOSE)
+
+# Section names that may appear on a line of their own
+SECTIONS = {"commander", "commanders", "companion", "deck", "main", "mainboard", "sideboard",
+            "maybeboard", "considering", "creatures", "creature", "instants", "instant",
+            "sorceries", "sorcery", "artifacts", "artifact", "enchantments", "enchantment",
+            "planeswalkers", "planeswalker", "battles", "battle", "lands", "land", "other"}
+
+HEADER = re.compile(r"\s*(?P<comment>//|#)?\s*(?P<section>[A-Za-z][A-Za-z ]*?)\s*(?:\(\d+\))?\s*(?P<colon>:)?\s*$")
+
+# Cards under these sections aren't part of the deck
+SKIPPED_SECTIONS = {"sideboard", "maybeboard", "considering"}
+
+
+"""Parse one line into (quantity, name, annotations), or None if it isn't a card line
+   annotations is None when the line has none, otherwise a dictionary of what it had"""
+def parse_line(line):
+
+    match = LINE.match(line)
+    if match is None:
+        return None
+
+    # Most lines have no annotations, so the second regex is only run when it could find one
+    quantity, name = match.groups()
+    if "(" in name or "*" in name or "[" in name or "^" in name:
+        return (int(quantity),) + split_annotations(name)
+    return int(quantity), name, None
+
+
+"""Split the annotations off the end of a card line, returning (name, annotations)"""
+def split_annotations(text):
+
+    name, set_code, number, markers, tags = ANNOTATED.fullmatch(text).group("name", "set", "number",
+                                                                           "markers", "tags")
+    if not (set_code or markers or tags):
+        return name, None
+
+    annotations = {}
+    if set_code:
+        annotations["set"] = set_code.lower()
+        if number:
+            annotations["number"] = number
+    if markers:
+        annotations["markers"] = [marker.strip("*").upper() for marker in markers.split()]
+    if tags:
+        annotations["tags"] = [tag.strip() for tag in re.findall(r"\[([^\]]*)\]", tags)]
+
+    return name, annotations
+
+
+"""Return the section a header line starts (lowercase), or None if it isn't a header"""
+def parse_header(line):
+
+    match = HEADER.match(line)
+    if match is None:
+        return None
+
+    section = match.group("section").lower()
+    if match.group("comment") or match.group("colon") or section in SECTIONS:
+        return section
+    return None
+
+
+"""Parse lines one at a time, yielding (quantity, name, annotations) for every card line
+   Lines that can't be read are added to 'malformed' as (line number, line), if it's given
+   The current section (if any) is added to each card's annotations"""
+def parse_decklist(lines, malformed=None):
+
+    section = None
+    for number, line in enumerate(lines, 1):
+
+        card = parse_line(line)
+        if card is not None:
+            if section is not None:
+                quantity, name, annotations = card
+                if annotations is None:
+                    annotations = {}
+                annotations["section"] = section
+                card = quantity, name, annotations
+
+            yield card
+            continue
+
+        if not line.strip():
+            continue
+
+        header = parse_header(line)
+        if header is not None:
+            section = header
+        elif malformed is not None:
+            malformed.append((number, line.rstrip("\r\n")))
+
+
+"""Read a whole decklist, returning ([(quantity, name, annotations), ...], malformed lines)
+   Repeated names are added together (keeping the first line's annotations),
+   and cards in the sideboard/maybeboard sections are left out"""
+def read_decklist(lines, skipped_sections=SKIPPED_SECTIONS):
+
+    malformed = []
+    entries = {}
+    for quantity, name, annotations in parse_decklist(lines, malformed):
+        if annotations is not None and annotations.get("section") in skipped_sections:
+            continue
+
+        entry = entries.get(name)
+        if entry is None:
+            entries[name] = [quantity, name, annotations]
+        else:
+            entry[0] += quantity
+
+    return [tuple(entry) for entry in entries.values()], malformed
@@ -1,39 +1,123 @@
-from bs4 import BeautifulSoup
-from requests import get
 from re import search
+from http_client import HttpClient
+from deck_cache import DeckCache
+import asyncio
+import logging
+import threading
+import requests
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 headers = {
     "User-Agent": "Mozilla/5.0"
 }
 
+# One pooled session for every Archidekt request
+client = HttpClient(headers=headers)
+
+# Archidekt's JSON deck search, and where each deck's JSON is
+SEARCH_API = "https://archidekt.com/api/decks/v3/"
+DECK_API = "https://archidekt.com/api/decks/"
+
+# How many decks are fetched at once (kept within the client's connection pool)
+CONCURRENCY = 8
+
+# Deck JSON we've already fetched, opened the first time it's needed
+_deck_cache = None
+_cache_lock = threading.Lock()
+
+
+"""The deck cache, opened on first use"""
+def get_deck_cache():
+    global _deck_cache
+
+    with _cache_lock:
+        if _deck_cache is None:
+            _deck_cache = DeckCache()
+        return _deck_cache
+
 """Given a username and a deck name, this function returns the deck's url and id"""
 def search_archidekt(owner_username, deck_name):
 
+    decks = search_decks(owner_username, deck_name)
+    if not decks:
+        logger.warning("Deck URL not found.")
+        return None, None
+
+    # The most recently updated match
+    deck_id = decks[0]["id"]
+    deck_url = f"https://archidekt.com/decks/{deck_id}"
+    logger.info(f"Found deck URL: {deck_url}")
+    logger.info(f"Deck ID: {deck_id}")
+    return deck_url, deck_id
+
+"""Given a username and a deck name, this function returns the matching decks, most recently updated first
+   Each is a dictionary with the deck's id, name, owner and updatedAt"""
+def search_decks(owner_username, deck_name):
+
+    # Archidekt's JSON search, falling back to scraping the search page if it doesn't work
+    try:
+        response = client.get(SEARCH_API, params={"name": deck_name,
+                                                  "ownerUsername": owner_username,
+                                                  "orderBy": "-updatedAt"})
+        response.raise_for_status()
+        return parse_search_json(response.json())
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Archidekt search API failed ({e}), trying the search page instead")
+        return search_decks_html(owner_username, deck_name)
+
+"""Pull the id, name, owner and updatedAt of each deck out of a JSON search response"""
+def parse_search_json(data):
+
+    decks = []
+    for deck in data["results"]:
+        owner = deck.get("owner")
+        decks.append({"id": int(deck["id"]),
+                      "name": deck.get("name"),
+                      "owner": owner.get("username") if isinstance(owner, dict) else owner,
+                      "updatedAt": deck.get("updatedAt")})
+    return decks
+
+"""Same as search_decks, by scraping the html search page (only the ids and names are known)"""
+def search_decks_html(owner_username, deck_name):
+
     # Build the search url
     deck_name_for_url = deck_name.replace(" ", "_")
     search_url = f"https://archidekt.com/search/decks?name={deck_name_for_url}&orderBy=-updatedAt&ownerUsername={owner_username}"
 
     # Make the search
-    response = get(search_url, headers=headers)
+    response = client.get(search_url)
     if response.status_code != 200:
-        print("Failed to fetch:", response.status_code)
-        return None, None
+        logger.warning(f"Failed to fetch: {response.status_code}")
+        return []
+
+    return parse_search_html(response.text)
+
+"""Find every deck linked from an html search page"""
+def parse_search_html(text):
+
+    # Only needed for this fallback
+    from bs4 import BeautifulSoup
 
     # Parse the html into soup (whatever that means)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(text, 'html.parser')
 
-    # Find the url for the first deck (and by consequence, id)
+    # Find the url for each deck (and by consequence, id)
+    decks = []
+    seen = set()
     for a_tag in soup.find_all('a', href=True):
         href = a_tag['href']
         if href.startswith('/decks/'):
-            deck_url = "https://archidekt.com" + href
-            deck_id = extract_deck_id(deck_url)
-            print("Found deck URL:", deck_url)
-            print("Deck ID:", deck_id)
-            return deck_url, deck_id
-
-    print("Deck URL not found.")
-    return None, None
+            deck_id = extract_deck_id(href)
+            if deck_id is None or deck_id in seen:
+                continue
+            seen.add(deck_id)
+            decks.append({"id": deck_id,
+                          "name": a_tag.get_text(strip=True) or None,
+                          "owner": None,
+                          "updatedAt": None})
+    return decks
 
 """Given a deck's url, this function returns the deck's id"""
 def extract_deck_id(deck_url):
@@ -42,22 +126,50 @@ def extract_deck_id(deck_url):
         return int(match.group(1))
     return None
 
-"""Given a deck's id, this function returns a decklist and a list of commanders"""
-def get_archidekt_deck(deck_id):
-
-    # Open the provided deck
-    url = f"https://archidekt.com/api/decks/{deck_id}/"
-    response = get(url, headers=headers)
+"""Given a deck's id, this function returns the deck's JSON from Archidekt
+   A cached copy is reused if updated_at (when known, e.g. from a search) matches it,
+   or if Archidekt says it hasn't changed since it was fetched"""
+def get_deck_json(deck_id, updated_at=None):
+
+    cache = get_deck_cache()
+    cached = cache.lookup(deck_id)
+
+    # The deck hasn't been edited since we fetched it, no need to ask
+    if cached is not None and updated_at is not None and cached["updated_at"] == updated_at:
+        return cached["data"]
+
+    # Otherwise ask Archidekt, only getting the deck back if it changed
+    request_headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+
+    url = f"{DECK_API}{deck_id}/"
+    response = client.get(url, headers=request_headers)
+    if response.status_code == 304 and cached is not None:
+        return cached["data"]
     response.raise_for_status()
     data = response.json()
 
+    cache.store(deck_id, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return data
+
+"""Given a deck's id, this function returns a decklist and a list of commanders"""
+def get_archidekt_deck(deck_id, updated_at=None):
+    return parse_deck(get_deck_json(deck_id, updated_at))
+
+"""Given a deck's JSON, this function returns a decklist and a list of commanders
+   The decklist is a list of (quantity, card), keeping the card data Archidekt sent"""
+def parse_deck(data):
+
     # Extract cards from the deck
     cards = []
     commanders = []
     for card in data['cards']:
-        card_name = card['card']['oracleCard']['name']
         quantity = card['quantity']
-        cards.append(f"{quantity}x {card_name}")
+        cards.append((quantity, card['card']))
         if "Commander" in card.get('categories', []):
             commanders += [card['card']['oracleCard']['name']]
 
@@ -65,12 +177,37 @@ def get_archidekt_deck(deck_id):
         commanders += [None]
     return cards, commanders
 
+"""A deck given either by id or as a search result, as (id, updatedAt or None)"""
+def deck_key(deck):
+    if isinstance(deck, dict):
+        return deck["id"], deck.get("updatedAt")
+    return deck, None
+
+"""Fetch many decks at once, at most 'concurrency' at a time
+   Each deck is an id or a search result (see search_decks), whose updatedAt lets an unchanged cached
+   copy be used without asking Archidekt
+   Returns a (decklist, commanders) pair for each deck, in order, or the exception that deck raised"""
+async def fetch_decks(decks, concurrency=CONCURRENCY):
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def fetch(deck):
+        async with limit:
+            # The pooled client is blocking, so each request waits on a worker thread
+            return await asyncio.to_thread(get_archidekt_deck, *deck_key(deck))
+
+    return await asyncio.gather(*(fetch(deck) for deck in decks), return_exceptions=True)
+
+"""Same as above, for callers that aren't running an event loop"""
+def get_archidekt_decks(decks, concurrency=CONCURRENCY):
+    return asyncio.run(fetch_decks(decks, concurrency))
+
 
-"""Given a decklist in list form, return it as strings"""
+"""Given a decklist in list form, return it as "Nx Name" lines"""
 def archidekt_string(decklist):
     ret = ""
-    for card in decklist:
-        ret += card + "\n"
+    for quantity, card in decklist:
+        ret += f"{quantity}x {card['oracleCard']['name']}\n"
 
     return ret
 
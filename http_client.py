@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+Shared HTTP layer for Scryfall and Archidekt
+
+Each HttpClient keeps one pooled requests.Session (so connections are kept
+alive between calls), paces its requests with a token bucket, and retries
+rate limited or failed requests, waiting as long as the server's Retry-After
+asks or backing off exponentially with jitter otherwise.
+"""
+
+# Status codes worth trying again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+
+    """Allow 'rate' requests per second on average, with bursts of up to 'capacity'"""
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    """Block until a request is allowed"""
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    """Stop everyone from sending for a while (used when the server says to slow down)"""
+    def pause(self, seconds):
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class HttpClient:
+
+    """Create a client with a pooled session, an optional rate limit and a retry policy"""
+    def __init__(self, headers=None, rate=None, burst=1, max_retries=5,
+                 backoff=0.5, max_backoff=30, pool_size=10, timeout=60):
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = None if rate is None else TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+    """Send a request, retrying rate limits, server errors and dropped connections
+       The last response is returned if every retry fails"""
+    def request(self, method, url, **kwargs):
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            # Wait as long as the server asks, otherwise back off
+            delay = retry_after(response)
+            response.close()
+            if delay is not None and self.bucket is not None:
+                # Hold back every request sharing the bucket, not just this one
+                self.bucket.pause(delay)
+            else:
+                time.sleep(self.backoff_delay(attempt) if delay is None else delay)
+
+        return response
+
+    """Exponential backoff with full jitter"""
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+"""Read a Retry-After header (seconds or an HTTP date) as a number of seconds, or None"""
+def retry_after(response):
+
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,196 @@
+import math
+
+from Card import Card
+from card_store import COLORS, COLOR_BITS
+
+"""
+Land base recommendations
+
+allocate_basics splits the basic land slots between the deck's colors with
+largest remainder apportionment, so the counts always add up exactly. Each
+color is aimed at a share of all the lands in proportion to its colored pips,
+and the sources the fixed (nonbasic) lands already give count towards that.
+
+optimize_basics then (optionally) moves basics from one color to another for
+as long as that raises the simulated chance of casting spells on curve, see
+simulation.py. Land bases are compared by the geometric mean of each spell's
+chance (weighted by quantity) rather than the plain on curve rate, which an
+all-Forest land base wins whenever most of the cheap spells are green.
+
+choose_nonbasics picks nonbasic lands out of a list of candidates, one at a
+time, keeping the one that improves the land base most: by default the
+pip-weighted share of lands making each color, or with 'games' set, the
+simulated score above.
+"""
+
+# The basic land for each color, and the reverse
+BASICS = {"W": "Plains", "U": "Island", "B": "Swamp", "R": "Mountain", "G": "Forest"}
+BASIC_TYPES = {name: color for color, name in BASICS.items()}
+
+# Games played to score each candidate land base when searching by simulation
+SEARCH_GAMES = 2000
+
+
+"""The colors a land makes: its color identity plus its basic land types (a basic Forest has no color identity)
+   'produced' can give the colors of lands that make more than that ({name: colors}, see land_index.py)"""
+def land_colors(card, produced=None):
+    if produced and card.name in produced:
+        return produced[card.name]
+    colors = [color for color in COLORS if card.id_mask & COLOR_BITS[color]]
+    for land_type, color in BASIC_TYPES.items():
+        if land_type in card.types and color not in colors:
+            colors.append(color)
+    return colors
+
+
+"""Check whether a card is a land that's always played as a land and isn't a basic"""
+def is_nonbasic_land(card):
+    return card.is_land and not card.is_mdfc()[0] and "Basic" not in card.types
+
+
+"""Split 'seats' between the keys of 'weights' in proportion to their weights, by largest remainder"""
+def apportion(weights, seats):
+
+    total = sum(weights.values())
+    if seats <= 0 or total <= 0:
+        return {key: 0 for key in weights}
+
+    quotas = {key: weight * seats / total for key, weight in weights.items()}
+    counts = {key: int(quota) for key, quota in quotas.items()}
+
+    # Whatever is left goes to the largest remainders, the larger weight breaking ties
+    left = seats - sum(counts.values())
+    order = sorted(weights, key=lambda key: (quotas[key] - counts[key], weights[key]), reverse=True)
+    for key in order[:left]:
+        counts[key] += 1
+
+    return counts
+
+
+"""Recommend basics for a deck with 'land_count' lands, 'fixed_count' of which are already decided
+   fixed_sources is the number of those fixed lands making each color
+   Returns {basic land name: count}, leaving out basics with none"""
+def allocate_basics(pip_count, land_count, fixed_count=0, fixed_sources=None):
+
+    slots = max(0, round(land_count) - fixed_count)
+    fixed_sources = fixed_sources or {}
+    if not slots:
+        return {}
+
+    # A colorless deck plays Wastes
+    colors = {color: pips for color, pips in pip_count.items() if pips}
+    if not colors:
+        return {"Wastes": slots}
+
+    # How many sources each color should end up with, less what the fixed lands already give
+    targets = apportion(colors, slots + fixed_count)
+    shortfall = {color: max(0, target - fixed_sources.get(color, 0)) for color, target in targets.items()}
+
+    counts = apportion(shortfall if any(shortfall.values()) else colors, slots)
+    return {BASICS[color]: count for color, count in counts.items() if count}
+
+
+"""A basic land's Card, from our data if it's there"""
+def basic_card(name):
+    card = Card.get_local_card(name)
+    if card is None:
+        card = Card(name, "", 0, [], None, f"Basic Land — {name}", kind=0)
+    return card
+
+
+"""Simulated score of a library made of 'spells' [(Card, quantity)], fixed lands and basics:
+   the geometric mean of the chance of casting each spell on curve, weighted by quantity"""
+def simulated_score(spells, fixed, basics, games, turns, seed, produced=None):
+
+    # Only needed (along with NumPy) when searching by simulation
+    import simulation
+
+    entries = list(spells) + list(fixed) + [(basic_card(name), count) for name, count in basics.items()]
+    on_curve = simulation.run(simulation.Library(entries, produced), games, turns, True, seed)["on_curve"]
+    if not on_curve:
+        return 0.0
+
+    # A spell that's never castable counts as one game in 'games', so it still drags the score down
+    quantities = {card.name: quantity for card, quantity in entries}
+    total = sum(quantities[name] for name in on_curve)
+    logs = sum(quantities[name] * math.log(max(chance, 1 / games)) for name, chance in on_curve.items())
+    return math.exp(logs / total)
+
+
+"""Move basics between colors for as long as the simulated score goes up
+   spells and fixed are lists of (Card, quantity); returns (basics, score)
+   ('produced' is passed on to land_colors)"""
+def optimize_basics(spells, basics, fixed=(), games=SEARCH_GAMES, turns=7, seed=0, max_moves=20, produced=None):
+
+    # Every candidate is scored on the same shuffles (the library size never changes),
+    # so small differences aren't just noise
+    best = dict(basics)
+    best_score = simulated_score(spells, fixed, best, games, turns, seed, produced)
+
+    colors = [name for name in BASICS.values() if name in best]
+    for _ in range(max_moves):
+        improved = False
+        for source in colors:
+            for target in colors:
+                if source == target or not best.get(source):
+                    continue
+
+                candidate = dict(best)
+                candidate[source] -= 1
+                candidate[target] += 1
+                score = simulated_score(spells, fixed, candidate, games, turns, seed, produced)
+                if score > best_score:
+                    best, best_score, improved = candidate, score, True
+
+        if not improved:
+            break
+
+    return {name: count for name, count in best.items() if count}, best_score
+
+
+"""Pick up to 'count' nonbasic lands from 'candidates' (Cards), returning the chosen Cards in order
+   Without 'games', a land base scores the pip-weighted share of its lands making each color,
+   with 'games' it's scored by simulation as above (spells is then a list of (Card, quantity))
+   'produced' is passed on to land_colors"""
+def choose_nonbasics(candidates, pip_count, land_count, fixed=(), count=None,
+                     spells=None, games=0, turns=7, seed=0, produced=None):
+
+    total_pips = sum(pip_count.values())
+    fixed = list(fixed)
+    lands = round(land_count)
+
+    def score(chosen):
+        nonbasics = fixed + [(card, 1) for card in chosen]
+        fixed_count = sum(quantity for card, quantity in nonbasics)
+        sources = {}
+        for card, quantity in nonbasics:
+            for color in land_colors(card, produced):
+                sources[color] = sources.get(color, 0) + quantity
+        basics = allocate_basics(pip_count, land_count, fixed_count, sources)
+
+        if games:
+            return simulated_score(spells or [], nonbasics, basics, games, turns, seed, produced)
+
+        for name, basic_count in basics.items():
+            color = BASIC_TYPES.get(name)
+            if color is not None:
+                sources[color] = sources.get(color, 0) + basic_count
+        return sum(pips * sources.get(color, 0) for color, pips in pip_count.items()) / (total_pips * lands)
+
+    if not total_pips or not lands:
+        return []
+
+    chosen = []
+    remaining = list(dict.fromkeys(candidates))
+    best_score = score(chosen)
+    fixed_count = sum(quantity for card, quantity in fixed)
+
+    while remaining and (count is None or len(chosen) < count) and fixed_count + len(chosen) < lands:
+        scored = [(score(chosen + [card]), n) for n, card in enumerate(remaining)]
+        top, n = max(scored, key=lambda pair: (pair[0], -pair[1]))
+        if top <= best_score:
+            break
+        best_score = top
+        chosen.append(remaining.pop(n))
+
+    return chosen
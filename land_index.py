@@ -0,0 +1,191 @@
+import json
+import re
+from bisect import bisect_right
+from heapq import nlargest
+
+from card_format import write_atomic
+from card_store import COLORS, COLOR_BITS, bits_to_identity, identity_to_bits
+from land_base import BASIC_TYPES
+
+"""
+Precomputed nonbasic land candidates
+
+Every nonbasic land in the card data that makes colored mana is scored once
+for each of the 32 color identities it can be played in, and each identity
+keeps its lands sorted by price. Finding the best lands for a deck under a
+budget is then a bisect over that identity's prices and a pick of the
+highest scores below it, instead of a scan over the whole card pool. Each
+identity also keeps its lands ranked by score, which is quicker to walk when
+most of them are within the budget.
+
+A land's score for an identity is the number of the identity's colors it
+makes, plus a bit for having basic land types (it can be fetched), less a
+penalty for entering tapped: a full point when it always does, a little when
+only sometimes (check lands, shock lands), and half a point when there's no
+oracle text to tell. The colors come from Scryfall's produced_mana, or the
+color identity and basic land types for data saved without it.
+
+The index is rebuilt with the card data (Card.get_new_data) and saved next
+to the other card files.
+"""
+
+INDEX_FILE = "land_index.json"
+
+# Bumped whenever the file layout or the scores change, so older files get rebuilt
+VERSION = 1
+
+# How many candidates a lookup gives by default
+TOP_COUNT = 30
+
+# Taken off a land's score for entering tapped: always, only sometimes, or unknown (no oracle text)
+TAPPED_PENALTY = {"always": 1.0, "sometimes": 0.25, None: 0.5}
+
+# A bonus for basic land types
+TYPED_BONUS = 0.5
+
+ENTERS_TAPPED = re.compile(r"enters(?: the battlefield)? tapped", re.IGNORECASE)
+CONDITIONAL = re.compile(r"\bunless\b|\bif you don[’']t\b", re.IGNORECASE)
+
+
+"""Check whether Scryfall's data for a card is a nonbasic land that's only ever played as a land
+   (the front face is a land, so mdfcs with a spell on the front are left out)"""
+def is_land_candidate(card):
+    front = card.get("type_line", "").split(" // ")[0]
+    return "Land" in front and "Basic" not in front
+
+
+"""The basic land types in a card's type line"""
+def basic_land_types(card):
+    front = card.get("type_line", "").split(" // ")[0]
+    return [land_type for land_type in BASIC_TYPES if land_type in front.split()]
+
+
+"""Bitmask of the colors a land makes"""
+def produced_colors(card):
+
+    produced = card.get("produced_mana")
+    if produced is not None:
+        return identity_to_bits(produced)
+
+    colors = identity_to_bits(card.get("color_identity", []))
+    for land_type in basic_land_types(card):
+        colors |= COLOR_BITS[BASIC_TYPES[land_type]]
+    return colors
+
+
+"""Whether a land enters tapped: "always", "sometimes", "never", or None without oracle text"""
+def enters_tapped(card):
+
+    text = card.get("oracle_text")
+    if text is None:
+        return None
+
+    for sentence in re.split(r"(?<=\.)\s+|\n", text):
+        if ENTERS_TAPPED.search(sentence):
+            return "sometimes" if CONDITIONAL.search(sentence) else "always"
+    return "never"
+
+
+"""A land's score in a deck of the identity 'mask'"""
+def quality(colors, typed, tapped, mask):
+    made = bin(colors & mask).count("1")
+    return made + (TYPED_BONUS if typed else 0) - TAPPED_PENALTY.get(tapped, 0)
+
+
+class LandIndex:
+
+    """'lands' is a list of [name, price, colors, identity, typed, tapped],
+       'masks' a list of 32 dictionaries holding parallel price-sorted lists of prices, scores and lands,
+       plus 'ranked', the positions in those lists from the best score to the worst"""
+    def __init__(self, lands, masks):
+        self.lands = lands
+        self.masks = masks
+        self.numbers = {land[0]: number for number, land in enumerate(lands)}
+
+    """The names of the best 'count' lands for a color identity, at most 'budget' dollars each (None for any price)"""
+    def candidates(self, identity, budget=None, count=TOP_COUNT):
+
+        entry = self.masks[identity_to_bits(identity)]
+        prices = entry["prices"]
+        scores = entry["scores"]
+
+        # Everything up to 'end' is affordable
+        end = len(prices) if budget is None else bisect_right(prices, budget)
+
+        # Walking the ranking takes about count * len / end steps before it finds 'count' affordable lands,
+        # picking the best of the affordable ones takes about end
+        if end * end >= count * len(prices):
+            best = []
+            for i in entry["ranked"]:
+                if i < end:
+                    best.append(i)
+                    if len(best) == count:
+                        break
+        else:
+            best = nlargest(count, range(end), key=lambda i: (scores[i], -prices[i]))
+
+        return [self.lands[entry["lands"][i]][0] for i in best]
+
+    """The colors each of the named lands makes, as {name: colors}"""
+    def produced(self, names):
+        return {name: bits_to_identity(self.lands[self.numbers[name]][2]) for name in names if name in self.numbers}
+
+    def __len__(self):
+        return len(self.lands)
+
+    """Write the index to a file"""
+    def save(self, path=INDEX_FILE):
+        write_atomic(path, json.dumps({"version": VERSION, "lands": self.lands, "masks": self.masks},
+                                      separators=(",", ":")))
+
+
+"""Build the index from Scryfall card data (any iterable of card dictionaries)"""
+def build_land_index(cards):
+
+    lands = []
+    for card in cards:
+        if not is_land_candidate(card):
+            continue
+
+        price = card.get("prices", {}).get("usd")
+        colors = produced_colors(card)
+        if price is None or not colors:
+            continue
+
+        lands.append([card["name"], float(price), colors, identity_to_bits(card.get("color_identity", [])),
+                      bool(basic_land_types(card)), enters_tapped(card)])
+
+    # Cheapest first, names breaking ties so the file is the same every time
+    lands.sort(key=lambda land: (land[1], land[0]))
+
+    masks = []
+    for mask in range(1 << len(COLORS)):
+        entry = {"prices": [], "scores": [], "lands": []}
+        for number, (name, price, colors, identity, typed, tapped) in enumerate(lands):
+
+            # Playable in the identity, and making at least one of its colors
+            if identity & ~mask or not colors & mask:
+                continue
+            entry["prices"].append(price)
+            entry["scores"].append(quality(colors, typed, tapped, mask))
+            entry["lands"].append(number)
+
+        # Best score first, the cheaper land first when they tie (the lists are already by price)
+        entry["ranked"] = sorted(range(len(entry["scores"])), key=lambda i: -entry["scores"][i])
+        masks.append(entry)
+
+    return LandIndex(lands, masks)
+
+
+"""Load a saved index, or None if there isn't one (or it's from an older version)"""
+def load_land_index(path=INDEX_FILE):
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    if data.get("version") != VERSION:
+        return None
+    return LandIndex(data["lands"], data["masks"])
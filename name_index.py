@@ -0,0 +1,173 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+"""
+Forgiving card name lookups
+
+A NameIndex maps the names people actually type onto the exact names in our
+card data, so a decklist line only has to go online when the card really
+isn't there. In order, a name is matched:
+    - after normalizing it (case, accents, smart quotes, spacing, "/" vs "//",
+      a trailing set code such as "(MH2) 123", "[MH2]" or "*F*")
+    - by either face of a double faced card ("Emeria's Call")
+    - with its punctuation ignored ("Urzas Saga"), or through an alias
+    - as the start of exactly one name (at least PREFIX_LENGTH characters)
+    - by trigram similarity, if the best match scores at least the threshold
+      and isn't tied with a different card (and the name isn't the start of
+      several names, which means it was cut short rather than mistyped)
+"""
+
+# Names this short are only ever matched exactly
+PREFIX_LENGTH = 6
+
+# How alike (Dice coefficient of trigrams) a fuzzy match has to be
+SIMILARITY = 0.8
+
+# Characters that are typed differently than Scryfall spells them
+PUNCTUATION = str.maketrans({"‘": "'", "’": "'", "‚": "'", "′": "'", "`": "'",
+                             "“": '"', "”": '"',
+                             "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-",
+                             "æ": "ae", "Æ": "ae"})
+
+# A set code, collector number and/or foil marker after the name, as decklist exports add them
+SET_CODE = re.compile(r"(\s+(\([a-z0-9]{2,6}\)|\[[a-z0-9]{2,6}\])(\s+[a-z0-9-]+)?)?(\s+\*[a-z]+\*)*\s*$")
+
+# Any spelling of the split between two faces
+FACES = re.compile(r"\s*/{1,2}\s*")
+
+NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9 ]+")
+
+
+"""Lowercase a name and smooth over the ways it's commonly mistyped"""
+def normalize(name):
+
+    name = unicodedata.normalize("NFKD", name.translate(PUNCTUATION))
+    name = "".join(char for char in name if not unicodedata.combining(char)).lower()
+    name = SET_CODE.sub("", " ".join(name.split()))
+    return FACES.sub(" // ", name)
+
+
+"""A normalized name without its punctuation"""
+def loosen(name):
+    return " ".join(NOT_ALPHANUMERIC.sub("", name.replace("-", " ")).split())
+
+
+"""The set of trigrams of a (loosened) name"""
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+
+    """Index every name, plus any aliases given as {alias: name}"""
+    def __init__(self, names, aliases=None):
+
+        self.exact = {}
+        self.loose = {}
+        faces = {}
+
+        for name in names:
+            key = normalize(name)
+            self.exact.setdefault(key, name)
+
+            # Each face of a double faced card
+            if " // " in key:
+                for face in key.split(" // "):
+                    faces.setdefault(face, name)
+
+        # A full name always wins over a face that happens to share it
+        for face, name in faces.items():
+            self.exact.setdefault(face, name)
+
+        for alias, name in (aliases or {}).items():
+            self.exact.setdefault(normalize(alias), name)
+
+        # Names that only differ by punctuation can't be told apart, so they're left out
+        clashes = set()
+        for key, name in self.exact.items():
+            loose = loosen(key)
+            if self.loose.setdefault(loose, name) != name:
+                clashes.add(loose)
+        for loose in clashes:
+            del self.loose[loose]
+
+        # Sorted for prefix searches
+        self.sorted_keys = sorted(self.loose)
+
+        # Which keys each trigram appears in
+        self.sizes = []
+        self.postings = {}
+        for number, key in enumerate(self.sorted_keys):
+            grams = trigrams(key)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(number)
+
+        # Names already resolved (or not), since the same typo tends to come up again
+        self.resolved = {}
+
+    """Return the name in our data that a typed name most likely means, or None"""
+    def resolve(self, name, threshold=SIMILARITY):
+
+        if name in self.resolved:
+            return self.resolved[name]
+
+        key = normalize(name)
+        match = self.exact.get(key)
+        if match is None:
+            loose = loosen(key)
+            match = self.loose.get(loose)
+            if match is None:
+                matches = self.prefix_matches(loose)
+                if len(matches) == 1:
+                    match = matches.pop()
+                elif not matches:
+                    match = self.fuzzy_match(loose, threshold)
+
+        self.resolved[name] = match
+        return match
+
+    """The names starting with a (loosened) name, stopping once there are two"""
+    def prefix_matches(self, loose):
+
+        matches = set()
+        if len(loose) < PREFIX_LENGTH:
+            return matches
+
+        position = bisect_left(self.sorted_keys, loose)
+        while position < len(self.sorted_keys) and self.sorted_keys[position].startswith(loose):
+            matches.add(self.loose[self.sorted_keys[position]])
+            if len(matches) > 1:
+                break
+            position += 1
+
+        return matches
+
+    """The most similar name by trigrams, or None if nothing is similar enough (or two cards tie)"""
+    def fuzzy_match(self, loose, threshold=SIMILARITY):
+
+        if len(loose) < PREFIX_LENGTH:
+            return None
+        grams = trigrams(loose)
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        best = None
+        best_score = threshold
+        tied = False
+        for number, count in shared.items():
+            score = 2 * count / (len(grams) + self.sizes[number])
+            if score < best_score:
+                continue
+            name = self.loose[self.sorted_keys[number]]
+            if score > best_score or best is None:
+                best, best_score, tied = name, score, False
+            elif name != best:
+                tied = True
+
+        return None if tied else best
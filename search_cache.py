@@ -0,0 +1,63 @@
+import json
+import time
+
+from sqlite_cache import SqliteCache
+
+"""
+Persistent cache for cards that had to be looked up on Scryfall
+
+Entries survive restarts in a small SQLite file. Each one expires after a
+time to live, names Scryfall didn't know are remembered too (for a shorter
+time), and once the cache is full the least recently used entries are dropped.
+"""
+
+CACHE_FILE = "search_cache.sqlite"
+
+DAY = 24 * 60 * 60
+
+
+class SearchCache(SqliteCache):
+
+    table = "cards"
+    key = "name"
+    columns = """data TEXT,
+                 expires REAL NOT NULL"""
+
+    def __init__(self, path=CACHE_FILE, ttl=7 * DAY, negative_ttl=DAY, max_entries=5000):
+        super().__init__(path, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    """Look a name up, returning (True, card data) on a hit and (False, None) on a miss
+       A hit on a name Scryfall didn't know returns (True, None)"""
+    def lookup(self, name):
+
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT data, expires FROM cards WHERE name = ?", (name,)).fetchone()
+
+            # Expired entries count as misses and are removed
+            if row is None or row[1] < now:
+                if row is not None:
+                    self.db.execute("DELETE FROM cards WHERE name = ?", (name,))
+                    self.db.commit()
+                self.misses += 1
+                return False, None
+
+            self.touch(name, now)
+            self.hits += 1
+
+        return True, None if row[0] is None else json.loads(row[0])
+
+    """Remember the result of a search, None meaning the card wasn't found"""
+    def store(self, name, card):
+
+        now = time.time()
+        ttl = self.negative_ttl if card is None else self.ttl
+        data = None if card is None else json.dumps(card, separators=(",", ":"))
+
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO cards (name, data, expires, last_used) VALUES (?, ?, ?, ?)",
+                            (name, data, now + ttl, now))
+            self.evict()
+            self.db.commit()
@@ -0,0 +1,192 @@
+import numpy as np
+
+import card_store as store
+from land_base import land_colors
+
+"""
+Monte Carlo goldfish games
+
+Shuffles a deck's library many times at once (as NumPy arrays, one row per
+game) and plays it out alone for a number of turns: keep the opening seven,
+draw a card a turn, and play a land whenever one is in hand. That gives:
+    - the chance of having made every land drop by each turn
+    - for each spell, the chance of being able to cast it on curve (on the
+      turn equal to its mana value, with enough lands and enough sources of
+      each color in its cost)
+
+Lands are assumed to enter untapped and to make the colors of their color
+identity and basic land types (a basic Forest has no color identity). Mdfcs
+use the same tapped/untapped split as Card.is_mdfc: they're only played as a
+land when there's no regular land in hand, untapped ones before tapped ones,
+and a tapped one gives no mana the turn it's played.
+Other double faced cards ("dfc") count as spells, as they do in Deck.det_stats.
+The commanders stay in the command zone and mulligans aren't taken.
+"""
+
+# What a card in the library is when it comes to playing lands
+SPELL = 0
+LAND = 1
+MDFC_UNTAPPED = 2
+MDFC_TAPPED = 3
+
+# Games are simulated this many at a time, to keep the arrays a reasonable size
+CHUNK = 50000
+
+
+"""Classify a card for the simulation"""
+def land_kind(card):
+    is_mdfc, kind = card.is_mdfc()
+    if is_mdfc and kind == "untapped":
+        return MDFC_UNTAPPED
+    if is_mdfc and kind == "tapped":
+        return MDFC_TAPPED
+    if card.is_land and not is_mdfc:
+        return LAND
+    return SPELL
+
+
+"""A deck's library as (Card, quantity) pairs: everything but the commanders"""
+def library_entries(deck):
+    commanders = {card.name for card in deck.commander_cards if card is not None}
+    return [(card, quantity) for card, quantity in deck.entries.values() if card.name not in commanders]
+
+
+class Library:
+
+    """Lay a library of (Card, quantity) pairs out as one row of card numbers
+       plus a lookup array for each card attribute ('produced' is passed on to land_colors)"""
+    def __init__(self, entries, produced=None):
+
+        entries = [(card, quantity) for card, quantity in entries if quantity > 0]
+        self.cards = [card for card, quantity in entries]
+        quantities = [quantity for card, quantity in entries]
+
+        self.slots = np.repeat(np.arange(len(self.cards), dtype=np.int16), quantities)
+        self.kind = np.array([land_kind(card) for card in self.cards], dtype=np.int8)
+        self.colors = np.array([store.identity_to_bits(land_colors(card, produced)) for card in self.cards], dtype=np.uint8)
+        self.manavalue = np.array([card.manavalue for card in self.cards], dtype=np.float64)
+        self.pips = np.array([card.pips for card in self.cards], dtype=np.int16).reshape(len(self.cards), 5)
+        self.quantities = np.array(quantities)
+
+    def __len__(self):
+        return len(self.slots)
+
+
+"""Shuffle the library for 'games' games, returning only the first 'depth' cards of each"""
+def shuffle(library, games, depth, rng):
+
+    decks = np.tile(library.slots, (games, 1))
+    rows = np.arange(games)
+
+    # A Fisher-Yates shuffle that stops once the top 'depth' cards are decided, one step for every game at once
+    for i in range(min(depth, len(library) - 1)):
+        j = rng.integers(i, len(library), size=games)
+        top = decks[:, i].copy()
+        decks[:, i] = decks[rows, j]
+        decks[rows, j] = top
+
+    return decks[:, :depth]
+
+
+"""Play 'games' goldfish games of a deck for 'turns' turns, returning a dictionary of results
+   ('produced' is passed on to land_colors)"""
+def simulate(deck, games=100000, turns=7, on_the_play=True, seed=None, produced=None):
+    return run(Library(library_entries(deck), produced), games, turns, on_the_play, seed)
+
+
+"""Same as above, for a Library"""
+def run(library, games=100000, turns=7, on_the_play=True, seed=None):
+
+    rng = np.random.default_rng(seed)
+
+    # The spells worth asking about: something to cast within the turns played
+    spells = [i for i, card in enumerate(library.cards)
+              if library.kind[i] != LAND and 1 <= card.manavalue <= turns]
+
+    land_drops = np.zeros(turns)
+    lands = np.zeros(turns)
+    castable = np.zeros(len(spells))
+
+    for start in range(0, games, CHUNK):
+        count = min(CHUNK, games - start)
+        drops, played, cast = play(library, spells, count, turns, on_the_play, rng)
+        land_drops += drops
+        lands += played
+        castable += cast
+
+    on_curve = {library.cards[i].name: round(float(castable[n]) / games, 4) for n, i in enumerate(spells)}
+    weights = library.quantities[spells] if spells else np.zeros(0)
+
+    return {"games": games,
+            "turns": turns,
+            "on_the_play": on_the_play,
+            "land_drops": (land_drops / games).round(4).tolist(),
+            "average_lands": (lands / games).round(2).tolist(),
+            "on_curve": on_curve,
+            "on_curve_rate": round(float((castable / games) @ weights / weights.sum()), 4) if spells else None}
+
+
+"""Play one chunk of games, returning per turn sums of land drops made and lands in play,
+   and for each spell the number of games it could have been cast on curve"""
+def play(library, spells, games, turns, on_the_play, rng):
+
+    hand_size = 7 if on_the_play else 8
+    depth = min(hand_size + turns - 1, len(library))
+    decks = shuffle(library, games, depth, rng)
+
+    kind = library.kind[decks]
+    colors = library.colors[decks]
+    bits = np.array([store.COLOR_BITS[color] for color in store.COLORS], dtype=np.uint8)
+    produces = (colors[:, :, None] & bits) != 0
+
+    # Which card gets played as a land first: regular lands, then untapped mdfcs, then tapped ones,
+    # each in the order they were drawn
+    never = np.iinfo(np.int32).max
+    priority = np.where(kind == LAND, 0, np.where(kind == MDFC_UNTAPPED, 1, 2)) * depth + np.arange(depth)
+    priority = np.where(kind == SPELL, never, priority).astype(np.int32)
+
+    rows = np.arange(games)
+    in_play = np.zeros(games, dtype=np.int16)
+    sources = np.zeros((games, 5), dtype=np.int16)
+
+    # Spells grouped by the turn they'd be cast on, then by the colored pips they need,
+    # since spells needing the same pips on the same turn can be checked together
+    by_turn = {}
+    for n, i in enumerate(spells):
+        needs = by_turn.setdefault(int(library.manavalue[i]), {})
+        needs.setdefault(tuple(library.pips[i].tolist()), []).append(n)
+
+    land_drops = np.zeros(turns)
+    lands = np.zeros(turns)
+    castable = np.zeros(len(spells))
+
+    for turn in range(1, turns + 1):
+
+        # Only the cards drawn so far can be played
+        seen = min(hand_size + turn - 1, depth)
+        choice = priority[:, :seen].argmin(axis=1)
+        has_land = priority[rows, choice] != never
+
+        # Play it, and take it out of the running for later turns
+        chosen = choice[has_land]
+        priority[rows[has_land], chosen] = never
+        in_play += has_land
+        sources[has_land] += produces[rows[has_land], chosen]
+
+        # A tapped mdfc doesn't help this turn
+        tapped = np.zeros(games, dtype=bool)
+        tapped[has_land] = kind[rows[has_land], chosen] == MDFC_TAPPED
+        mana = in_play - tapped
+        usable = sources - (produces[rows, choice] & tapped[:, None])
+
+        land_drops[turn - 1] = (in_play >= turn).sum()
+        lands[turn - 1] = in_play.sum()
+
+        for pips, numbers in by_turn.get(turn, {}).items():
+            ok = mana >= turn
+            for color, count in enumerate(pips):
+                if count:
+                    ok &= usable[:, color] >= count
+            castable[numbers] = np.count_nonzero(ok)
+
+    return land_drops, lands, castable
@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import time
+
+"""
+Least recently used caches kept in a small SQLite file
+
+SqliteCache holds what SearchCache and DeckCache share: one table keyed by
+a single column with a last_used time, a lock around the connection (it's
+used from worker threads), hit/miss counters, and dropping the least
+recently used rows once there are more than max_entries. Subclasses name
+the table and its columns and do their own lookups and stores.
+
+Batch workers each open the same file, so it's kept in WAL mode (readers
+don't hold up a write) and a write waits for another process's to finish.
+"""
+
+# How long to wait for another connection's write before giving up, in seconds
+BUSY_TIMEOUT = 30
+
+
+class SqliteCache:
+
+    # Set by each subclass: the table, its key column (and its type), and the columns besides the key and last_used
+    table = None
+    key = None
+    key_type = "TEXT"
+    columns = None
+
+    """Open (or create) the cache file"""
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                                {self.key} {self.key_type} PRIMARY KEY,
+                                {self.columns},
+                                last_used REAL NOT NULL)""")
+        self.db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+        self.db.commit()
+
+    """Mark an entry as just used (call with the lock held)"""
+    def touch(self, key, now=None):
+        self.db.execute(f"UPDATE {self.table} SET last_used = ? WHERE {self.key} = ?",
+                        (time.time() if now is None else now, key))
+        self.db.commit()
+
+    """Drop the least recently used entries once the cache is over its size (call with the lock held)"""
+    def evict(self):
+        count = self.db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute(f"""DELETE FROM {self.table} WHERE {self.key} IN (
+                                    SELECT {self.key} FROM {self.table} ORDER BY last_used LIMIT ?)""",
+                            (count - self.max_entries,))
+
+    """Forget everything"""
+    def clear(self):
+        with self.lock:
+            self.db.execute(f"DELETE FROM {self.table}")
+            self.db.commit()
+
+    """Hit/miss counters and the current number of entries"""
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        self.db.close()
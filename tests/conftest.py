@@ -0,0 +1,80 @@
+import http.server
+import json
+import os
+import sys
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+"""
+Shared test fixtures
+
+stub_server starts a local HTTP server that stands in for Scryfall or
+Archidekt. It's given a function respond(request) -> (status, headers, body)
+and keeps every request it gets in .requests.
+"""
+
+
+class StubRequest:
+
+    def __init__(self, method, path, headers, body):
+        url = urlsplit(path)
+        self.method = method
+        self.path = url.path
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    """The body decoded as JSON"""
+    def json(self):
+        return json.loads(self.body)
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = StubRequest(self.command, self.path, dict(self.headers), self.rfile.read(length))
+        self.server.requests.append(request)
+
+        status, headers, body = self.server.respond(request)
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+
+    servers = []
+
+    def start(respond):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        server.respond = respond
+        server.requests = []
+        server.url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
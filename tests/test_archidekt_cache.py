@@ -0,0 +1,72 @@
+import time
+
+import grab_from_archidekt as Arch
+from deck_cache import DeckCache
+from search_cache import SearchCache
+
+
+def deck_json(deck_id):
+    return {"id": deck_id, "updatedAt": f"2024-01-0{deck_id}T00:00:00Z",
+            "cards": [{"quantity": 1, "categories": ["Commander"], "card": {"oracleCard": {"name": f"Commander {deck_id}"}}},
+                      {"quantity": 1, "categories": [], "card": {"oracleCard": {"name": "Sol Ring"}}}]}
+
+
+"""Each deck is at /<id>/, answering 304 when the client already has the current version"""
+def respond(request):
+    deck_id = int(request.path.strip("/"))
+    if request.headers.get("If-None-Match") == f'"v{deck_id}"':
+        return 304, {}, b""
+    return 200, {"ETag": f'"v{deck_id}"'}, deck_json(deck_id)
+
+
+def test_fetch_decks_revalidates_and_uses_updated_at(stub_server, tmp_path, monkeypatch):
+    server = stub_server(respond)
+    monkeypatch.setattr(Arch, "DECK_API", server.url + "/")
+    monkeypatch.setattr(Arch, "_deck_cache", DeckCache(str(tmp_path / "deck_cache.sqlite")))
+
+    # Nothing cached, every deck is downloaded
+    first = Arch.get_archidekt_decks([1, 2, 3])
+    assert [commanders[0] for decklist, commanders in first] == ["Commander 1", "Commander 2", "Commander 3"]
+    assert len(server.requests) == 3
+
+    # By id alone, each deck is revalidated and comes back from the cache on a 304
+    assert Arch.get_archidekt_decks([1, 2, 3]) == first
+    assert len(server.requests) == 6
+    assert all(request.headers.get("If-None-Match") for request in server.requests[3:])
+
+    # Search results carry updatedAt, so unchanged decks don't need a request at all
+    results = [{"id": deck_id, "updatedAt": deck_json(deck_id)["updatedAt"]} for deck_id in (1, 2, 3)]
+    assert Arch.get_archidekt_decks(results) == first
+    assert len(server.requests) == 6
+
+    # A changed updatedAt asks again
+    results[0]["updatedAt"] = "2024-02-01T00:00:00Z"
+    Arch.get_archidekt_decks(results)
+    assert len(server.requests) == 7
+
+
+def test_deck_cache_drops_least_recently_used(tmp_path):
+    cache = DeckCache(str(tmp_path / "deck_cache.sqlite"), max_entries=2)
+    cache.store(1, deck_json(1))
+    time.sleep(0.01)
+    cache.store(2, deck_json(2))
+    time.sleep(0.01)
+    cache.lookup(1)
+    time.sleep(0.01)
+    cache.store(3, deck_json(3))
+
+    assert cache.lookup(2) is None
+    assert cache.lookup(1)["data"] == deck_json(1)
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 2}
+    cache.close()
+
+
+def test_search_cache_expires_entries(tmp_path):
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite"), ttl=60, negative_ttl=-1)
+    cache.store("Sol Ring", {"name": "Sol Ring"})
+    cache.store("Not A Card", None)
+
+    assert cache.lookup("Sol Ring") == (True, {"name": "Sol Ring"})
+    assert cache.lookup("Not A Card") == (False, None)
+    assert cache.stats()["entries"] == 1
+    cache.close()
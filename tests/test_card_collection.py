@@ -0,0 +1,59 @@
+import re
+
+import Card as card_data
+from Card import Card
+from search_cache import SearchCache
+
+
+def scryfall_card(name, price):
+    return {"object": "card", "name": name, "mana_cost": "{1}", "cmc": 1.0, "color_identity": [],
+            "type_line": "Artifact", "prices": {"usd": price}}
+
+
+"""The collection endpoint gives the default printing, a search the cheapest one"""
+def respond(request):
+    if request.path == "/cards/collection":
+        names = [identifier["name"] for identifier in request.json()["identifiers"]]
+        return 200, {}, {"object": "list",
+                         "data": [scryfall_card(name, "5.00") for name in names if name != "Not A Card"],
+                         "not_found": [{"name": "Not A Card"}] if "Not A Card" in names else []}
+    if request.path == "/cards/search":
+        names = re.findall(r'!"([^"]*)"', request.query["q"])
+        return 200, {}, {"object": "list", "has_more": False,
+                         "data": [scryfall_card(name, "1.25") for name in names if name != "Not A Card"]}
+    return 404, {}, {"object": "error", "details": "Not found"}
+
+
+def test_batched_lookup_uses_cheapest_printing(stub_server, tmp_path, monkeypatch):
+    server = stub_server(respond)
+    monkeypatch.setattr(card_data, "SCRYFALL_API", server.url)
+    monkeypatch.setattr(card_data, "_search_cache", SearchCache(str(tmp_path / "search_cache.sqlite")))
+    monkeypatch.setattr(card_data, "_searched", type(card_data._searched)())
+    monkeypatch.setattr(Card, "get_local_card", staticmethod(lambda name: None))
+    monkeypatch.setattr(Card, "det_kind", staticmethod(lambda name: 0))
+
+    cards = Card.get_cards_by_names(["Stub Ring", "Stub Signet", "Not A Card"])
+
+    # All the misses go out in one collection request, then one search for their cheapest printings
+    assert [request.path for request in server.requests] == ["/cards/collection", "/cards/search"]
+    assert cards["Stub Ring"].price == cards["Stub Signet"].price == "1.25"
+    assert cards["Not A Card"] is None
+
+    # A single lookup gets the same printing
+    card_data._search_cache.clear()
+    card_data._searched.clear()
+    card = Card.get_card_by_name("Stub Ring")
+    assert card.name == "Stub Ring" and card.price == "1.25"
+
+
+def test_search_cheapest_splits_long_queries(stub_server, monkeypatch):
+    server = stub_server(respond)
+    monkeypatch.setattr(card_data, "SCRYFALL_API", server.url)
+    monkeypatch.setattr(card_data, "SEARCH_QUERY_LENGTH", 60)
+
+    names = [f"Stub Card {i}" for i in range(10)]
+    found = Card.search_cheapest(names)
+
+    assert sorted(found) == sorted(names)
+    assert len(server.requests) > 1
+    assert all(len(request.query["q"]) <= 60 + len(" cheapest:usd") + 2 for request in server.requests)
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+import card_store as store
+import deck_table
+from Card import Card
+
+
+class TableDeck:
+
+    """Just what DeckTable reads from a Deck: its entries, commanders and identity"""
+    def __init__(self, cards, commanders=("Commander",), identity="WG"):
+        self.entries = {card.name: [card, quantity] for card, quantity in cards}
+        self.commander = list(commanders)
+        self.identity = identity
+
+
+def card(name, cost, manavalue, price, types, identity=("W",), kind=0):
+    return Card(name, cost, manavalue, identity, price, types, kind)
+
+
+def test_statistics_for_many_decks_at_once():
+    spells = TableDeck([(card("Commander", "{2}{W}{G}", 4, "3.00", "Legendary Creature", ("W", "G")), 1),
+                        (card("Ramp", "{1}{G}", 2, "0.50", "Sorcery", ("G",), kind=store.CHEAP), 3),
+                        (card("Bolt", "{R}", 1, "1.00", "Instant", ("R",)), 1),
+                        (card("Plains", "", 0, "0.10", "Basic Land — Plains", ()), 10)])
+    lands = TableDeck([(card("Plains", "", 0, "0.10", "Basic Land — Plains", ()), 20)], identity="W")
+
+    first, second = deck_table.analyze_decks([spells, lands])
+
+    assert first["spell_count"] == 5
+    assert first["avg_manavalue"] == round((4 + 3 * 2 + 1) / 5, 2)
+    assert first["land_count"] == 10
+    assert first["cheap_count"] == 3
+    assert first["total_price"] == round(3 + 1.5 + 1 + 1, 2)
+    assert first["identity_violations"] == 1
+    assert first["pip_count"] == {"W": 1, "U": 0, "B": 0, "R": 1, "G": 4}
+
+    # A deck without spells averages 0, like Deck.det_stats
+    assert second["avg_manavalue"] == 0
+    assert second["rec_land_count"] == round((100 - 1) / 60 * (19.59 + 0.27) + 1.35, 2)
+
+
+def test_missing_prices():
+    deck = TableDeck([(card("Commander", "{W}", 1, "2.00", "Legendary Creature"), 1),
+                      (card("Unpriced", "{W}", 1, "Price not available", "Instant"), 2)])
+
+    assert deck_table.analyze_decks([deck])[0]["total_price"] == 2.0
+    assert deck_table.analyze_decks([deck])[0]["unpriced_count"] == 2
+    assert math.isnan(deck_table.analyze_decks([deck], missing_price="nan")[0]["total_price"])
+    with pytest.raises(ValueError):
+        deck_table.analyze_decks([deck], missing_price="raise")
@@ -0,0 +1,58 @@
+import time
+from email.utils import formatdate
+
+from http_client import HttpClient, retry_after
+
+
+def test_token_bucket_paces_requests(stub_server):
+    server = stub_server(lambda request: (200, {}, {"ok": True}))
+    client = HttpClient(rate=10, burst=1)
+
+    start = time.monotonic()
+    for _ in range(11):
+        assert client.get(server.url).status_code == 200
+    elapsed = time.monotonic() - start
+
+    # The first request goes straight away, the other ten wait a tenth of a second each
+    assert elapsed >= 0.95
+    assert len(server.requests) == 11
+    client.close()
+
+
+def test_retry_after_is_honored(stub_server):
+    answers = []
+    server = stub_server(lambda request: answers.pop(0))
+
+    # With a rate limit the whole bucket is paused, without one the request sleeps
+    for client in (HttpClient(rate=100), HttpClient()):
+        answers[:] = [(429, {"Retry-After": "1"}, {"object": "error"}), (200, {}, {"ok": True})]
+        start = time.monotonic()
+        response = client.get(server.url)
+        elapsed = time.monotonic() - start
+
+        assert response.status_code == 200
+        assert 0.9 <= elapsed < 3
+        client.close()
+
+    assert len(server.requests) == 4
+
+
+def test_gives_up_after_max_retries(stub_server):
+    server = stub_server(lambda request: (503, {"Retry-After": "0"}, {"object": "error"}))
+    client = HttpClient(max_retries=2)
+
+    assert client.get(server.url).status_code == 503
+    assert len(server.requests) == 3
+    client.close()
+
+
+def test_retry_after_formats():
+
+    class Response:
+        def __init__(self, value):
+            self.headers = {} if value is None else {"Retry-After": value}
+
+    assert retry_after(Response("2")) == 2.0
+    assert retry_after(Response(None)) is None
+    assert retry_after(Response("soon")) is None
+    assert 8 <= retry_after(Response(formatdate(time.time() + 10, usegmt=True))) <= 10
@@ -1,11 +1,111 @@
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, ttk
 from Deck import Deck
 import grab_from_archidekt as Arch
+import os
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from Card import Card
 
 
+# ---------- Background analysis ----------
+
+# Imports and analysis run on worker threads so the window never freezes
+executor = ThreadPoolExecutor(max_workers=2)
+
+# Finished analyses, keyed by what was submitted (least recently used dropped first)
+results_cache = OrderedDict()
+RESULTS_CACHE_SIZE = 50
+
+# Submissions still running, keyed the same way, so repeats wait on the same one
+pending = {}
+
+# The submission whose result should be shown (None once cancelled)
+current_key = None
+
+# Set while new data is gathered, the card store is rebuilt under any analysis that's running
+refreshing = False
+
+
+# Run a task in the background and show its result when it finishes
+# Results are only cached when 'cache' is set, for inputs that can't change without their key changing
+def submit_task(key, task, cache=True):
+    global current_key
+
+    if refreshing:
+        update_stats("Getting new data, try again once it's done.")
+        return
+
+    current_key = key
+
+    # Same input as before, show the answer we already have
+    if cache and key in results_cache:
+        results_cache.move_to_end(key)
+        show_busy(False)
+        update_stats(results_cache[key])
+        return
+
+    show_busy(True)
+    update_stats("Analyzing deck...")
+
+    # Same input is already running, its result will be shown when it's done
+    if key in pending:
+        return
+
+    future = executor.submit(task)
+    pending[key] = future
+    future.add_done_callback(lambda future: root.after(0, task_done, key, future, cache))
+
+
+# Called on the GUI thread once a task finishes (or is cancelled before starting)
+def task_done(key, future, cache=True):
+    pending.pop(key, None)
+    if future.cancelled():
+        return
+
+    try:
+        message = future.result()
+    except Exception as e:
+        message = f"Error loading deck: {e}"
+    else:
+        if cache:
+            results_cache[key] = message
+            while len(results_cache) > RESULTS_CACHE_SIZE:
+                results_cache.popitem(last=False)
+
+    # Only show it if it's still what the user is waiting for
+    if key == current_key:
+        show_busy(False)
+        update_stats(message)
+
+
+# Stop waiting for the current submission
+def cancel_task():
+    global current_key
+    if current_key is None:
+        return
+
+    # A task that hasn't started yet is dropped, a running one finishes and is cached but not shown
+    future = pending.get(current_key)
+    if future is not None:
+        future.cancel()
+
+    current_key = None
+    show_busy(False)
+    update_stats("Cancelled.")
+
+
+# Start or stop the progress indicator
+def show_busy(busy):
+    if busy:
+        progress_bar.start(10)
+        cancel_button.config(state=tk.NORMAL)
+    else:
+        progress_bar.stop()
+        cancel_button.config(state=tk.DISABLED)
+
+
 # Handle file upload and submit
 def upload_file():
     filepath = filedialog.askopenfilename()
@@ -24,13 +124,21 @@ def submit_file():
     commander2 = commander2_entry.get() or None
     file_path = file_label.cget("text")
 
-    # Create the Deck object
+    # Create the Deck object in the background
     if file_path:
-        my_deck = Deck(commander1, commander2)
-        my_deck.import_decklist_from_file(file_path)
+        def task():
+            my_deck = Deck(commander1, commander2)
+            my_deck.import_decklist_from_file(file_path)
+            return stats_message(my_deck)
+
+        # Include when the file was changed, so an edited file is analyzed again
+        try:
+            modified = os.path.getmtime(file_path)
+        except OSError:
+            modified = None
 
         # Display stats
-        update_stats_output(my_deck)
+        submit_task(("file", file_path, modified, commander1, commander2), task)
     else:
         update_stats("No file selected.")
 
@@ -40,28 +148,28 @@ def submit_username_deck():
     username = username_entry.get()
     deck_name = deck_name_entry.get()
 
-    # Create the Deck object and display stats
-    try:
-        my_deck = Deck.import_decklist_from_archidekt(username, deck_name)
-        update_stats_output(my_deck)
-    except Exception as e:
-        update_stats(f"Error loading deck: {e}")
+    # Create the Deck object in the background and display stats
+    def task():
+        return stats_message(Deck.import_decklist_from_archidekt(username, deck_name))
+
+    # Not cached, the deck can be edited on Archidekt (its fetch checks for that)
+    submit_task(("archidekt", username, deck_name), task, cache=False)
 
 
 # Handle URL submit
 def submit_url():
     url = url_entry.get()
 
-    try:
+    def task():
         # Grab the data from Archidekt
         my_decklist, commanders = Arch.get_archidekt_deck(Arch.extract_deck_id(url))
 
-        # Create the Deck object and display stats
-        my_deck = Deck(commanders[0], commanders[1])
-        my_deck.import_decklist_from_text(Arch.archidekt_string(my_decklist))
-        update_stats_output(my_deck)
-    except Exception as e:
-        update_stats(f"Error loading deck: {e}")
+        # Create the Deck object straight from Archidekt's card data
+        my_deck = Deck.from_archidekt_list(my_decklist, commanders)
+        return stats_message(my_deck)
+
+    # Display stats once it's done (not cached, the deck can be edited on Archidekt)
+    submit_task(("url", url), task, cache=False)
 
 
 # Handle large list submit
@@ -70,17 +178,21 @@ def submit_large_list():
     commander2 = commander2_entry.get() or None
     large_list = list_text.get(1.0, tk.END).strip()
 
-    # Create a Deck object and display stats
+    # Create a Deck object in the background and display stats
     if large_list:
-        my_deck = Deck(commander1, commander2)
-        my_deck.import_decklist_from_text(large_list)
-        update_stats_output(my_deck)
+        def task():
+            my_deck = Deck(commander1, commander2)
+            my_deck.import_decklist_from_text(large_list)
+            return stats_message(my_deck)
+
+        submit_task(("list", large_list, commander1, commander2), task)
     else:
         update_stats("No list provided.")
 
 
 # Output stats the same, no matter what input method was used
-def update_stats_output(my_deck):
+# (only builds the text, so it's safe to call off the GUI thread)
+def stats_message(my_deck):
     message = f"""Here are some stats for your deck:
 
 Commanders: {my_deck.commander}
@@ -98,7 +210,18 @@ You should play these basics:
 (I'll get to nonbasic lands later)
 """
 
-    update_stats(message)
+    # Anything the analysis flagged
+    result = my_deck.result
+    for warning in result.warnings:
+        message += f"\n{warning}\n"
+    for name, identity in result.identity_violations:
+        message += f"\n{name} ({identity}) is not in the deck's identity ({my_deck.identity})"
+    if result.unresolved:
+        message += f"\n\nCouldn't find: {', '.join(result.unresolved)}"
+    for number, line in result.malformed:
+        message += f"\nCouldn't read line {number}: {line}"
+
+    return message
 
 
 # Updates the stats display with new content
@@ -222,19 +345,38 @@ tk.Button(url_frame, text="Submit URL", command=submit_url).pack(pady=5)
 # ----- New Data Gathering Button -----
 
 def get_new_data():
+    global refreshing
+    if refreshing:
+        return
+
     # Update label immediately
     get_data_status.config(text="Getting new data...\nThis will take a while...")
 
+    # No new analyses until it's done, and the ones already running finish before the data changes
+    refreshing = True
+    running = list(pending.values())
+
     # Start long task in background thread
-    threading.Thread(target=run_long_task, daemon=True).start()
+    threading.Thread(target=run_long_task, args=(running,), daemon=True).start()
 
-def run_long_task():
+def run_long_task(running):
     try:
-        Card.get_new_data()
+        wait(running)
+        # Show each stage as it finishes
+        Card.get_new_data(progress=lambda stage, message: root.after(
+            0, lambda: get_data_status.config(text=f"Getting new data...\n{stage}: {message}")))
         # Now update label back in GUI thread when done
         root.after(0, lambda: get_data_status.config(text="New data gathered!"))
+        # Analyses done with the old data are out of date
+        root.after(0, results_cache.clear)
     except Exception as e:
         root.after(0, lambda: get_data_status.config(text=f"Error: {e}"))
+    finally:
+        root.after(0, finish_refresh)
+
+def finish_refresh():
+    global refreshing
+    refreshing = False
 
 # ---------- Get New Data Section ----------
 
@@ -256,10 +398,17 @@ tk.Button(get_data_frame, text="Get New Data", command=get_new_data).pack(pady=5
 
 tk.Label(right_frame, text="Stats Output", font=("Helvetica", 14, "bold")).pack()
 
-stats_text = tk.Text(right_frame, height=30, width=50, wrap=tk.WORD)
+stats_text = tk.Text(right_frame, height=28, width=50, wrap=tk.WORD)
 stats_text.pack(pady=10)
 stats_text.config(state=tk.DISABLED)
 
+# Shows that an analysis is running, and lets the user give up on it
+progress_bar = ttk.Progressbar(right_frame, mode="indeterminate", length=300)
+progress_bar.pack()
+
+cancel_button = tk.Button(right_frame, text="Cancel", command=cancel_task, state=tk.DISABLED)
+cancel_button.pack(pady=5)
+
 
 # ---------- Grid Configuration ----------
 
@@ -276,3 +425,6 @@ root.resizable(False, False)
 # ---------- Start GUI ----------
 
 root.mainloop()
+
+# Don't wait on analyses nobody will see
+executor.shutdown(wait=False, cancel_futures=True)